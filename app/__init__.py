@@ -1,8 +1,22 @@
 from flask import Flask, jsonify
+from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_jwt_extended import JWTManager
 from app.config import Config
 from app.common.db import db
-from app.common.models import TokenBlocklist, PasswordResetOTP
+from app.common.models import TokenBlocklist, PasswordResetOTP, ProjectBlob, ProjectEvent, RefreshToken, ScheduledJob, User
+from app.common.migrations import run_migrations
+from app.common.cold_storage import archive_idle_blobs, get_cold_store
+from app.common.metrics import metrics
+from app.common.cache import create_response_cache
+from app.common.compression import CompressionMiddleware
+from app.common.events import EventBroker
+from app.common.rate_limit import init_rate_limiter
+from app.common.admission import init_admission_control
+from app.common.logs import init_logging
+from app.common.pool import init_pool_telemetry, DatabaseProbe
+from app.common import repository
+from app.auth.tokens import is_token_version_revoked
+from app.auth.revocations import RevocationWriter
 import time
 import logging
 import threading
@@ -12,18 +26,36 @@ def create_app():
     app.config.from_object(Config)
     
     # Configure logging
-    logging.basicConfig(level=logging.INFO)
+    init_logging(app)
     logger = logging.getLogger(__name__)
     
     # Initialize extensions
     db.init_app(app)
+    init_pool_telemetry(app)
+    app.extensions['db_probe'] = DatabaseProbe(app, interval=app.config['HEALTH_PROBE_INTERVAL_SECONDS'])
     jwt = JWTManager(app)
+    create_response_cache(app, 'project_list', app.config['PROJECT_LIST_CACHE_SIZE'])
+    app.extensions['event_broker'] = EventBroker(app, poll_interval=app.config['EVENTS_POLL_INTERVAL_SECONDS'])
+    app.extensions['revocation_writer'] = RevocationWriter(app, max_delay=app.config['REVOCATION_FLUSH_DELAY_SECONDS'])
+    init_rate_limiter(app)
+    init_admission_control(app)
     
     # JWT token in blocklist loader
     @jwt.token_in_blocklist_loader
     def check_if_token_revoked(jwt_header, jwt_payload):
+        # Password changes and resets revoke everything issued for older token versions
+        if is_token_version_revoked(jwt_payload):
+            return True
+        
+        # Refresh tokens are checked against their own record when exchanged
+        if jwt_payload['type'] == 'refresh':
+            return False
+        
+        # Tokens revoked by this worker are rejected before their group commit lands
         jti = jwt_payload['jti']
-        return TokenBlocklist.is_jti_blocklisted(jti)
+        if app.extensions['revocation_writer'].is_revoked(jti):
+            return True
+        return repository.is_jti_blocklisted(jti)
     
     # JWT revoked token callback
     @jwt.revoked_token_loader
@@ -39,10 +71,36 @@ def create_app():
     app.register_blueprint(projects_bp, url_prefix='/api/projects')
     app.register_blueprint(users_bp, url_prefix='/api/users')
     
-    # Health check endpoint
+    # Compress responses and accept gzip-encoded request bodies
+    app.wsgi_app = CompressionMiddleware(
+        app.wsgi_app,
+        min_size=app.config['COMPRESSION_MIN_SIZE'],
+        gzip_level=app.config['COMPRESSION_GZIP_LEVEL'],
+        brotli_quality=app.config['COMPRESSION_BROTLI_QUALITY'],
+        cache_size=app.config['COMPRESSION_CACHE_SIZE'],
+        max_request_size=app.config['MAX_DECOMPRESSED_REQUEST_BYTES']
+    )
+    
+    # Take the client address from trusted reverse proxies' X-Forwarded-* headers
+    if app.config['TRUSTED_PROXY_COUNT'] > 0:
+        app.wsgi_app = ProxyFix(
+            app.wsgi_app,
+            x_for=app.config['TRUSTED_PROXY_COUNT'],
+            x_proto=app.config['TRUSTED_PROXY_COUNT']
+        )
+    
+    # Readiness check endpoint; the database probe result is cached between checks
     @app.route('/health')
     def health():
-        return jsonify({'status': 'healthy', 'message': 'API is running'}), 200
+        database = app.extensions['db_probe'].check()
+        if not database['ok']:
+            return jsonify({'status': 'unavailable', 'message': 'Database is unreachable', 'database': database}), 503
+        return jsonify({'status': 'healthy', 'message': 'API is running', 'database': database}), 200
+    
+    # Metrics endpoint (per worker process)
+    @app.route('/metrics')
+    def get_metrics():
+        return jsonify(metrics.snapshot()), 200
     
     # Root endpoint
     @app.route('/')
@@ -52,6 +110,7 @@ def create_app():
             'version': '1.0.0',
             'endpoints': {
                 'health': '/health',
+                'metrics': '/metrics',
                 'auth': '/api/auth/*',
                 'projects': '/api/projects/*',
                 'users': '/api/users/*'
@@ -63,24 +122,56 @@ def create_app():
         """Periodically clean up expired tokens and OTPs from database"""
         with app.app_context():
             try:
+                # Only one worker across all hosts runs each hourly cleanup
+                if not ScheduledJob.claim('cleanup', app.config['CLEANUP_INTERVAL_SECONDS']):
+                    return
+                
                 # Clean up expired tokens
                 tokens_cleaned = TokenBlocklist.cleanup_expired_tokens()
                 if tokens_cleaned > 0:
-                    logger.info(f"Cleaned up {tokens_cleaned} expired tokens from blocklist")
+                    logger.info("Cleaned up %s expired tokens from blocklist", tokens_cleaned)
+                
+                # Clean up expired refresh tokens
+                refresh_tokens_cleaned = RefreshToken.cleanup_expired_tokens()
+                if refresh_tokens_cleaned > 0:
+                    logger.info("Cleaned up %s expired refresh tokens", refresh_tokens_cleaned)
                 
                 # Clean up expired OTPs
                 otps_cleaned = PasswordResetOTP.cleanup_expired_otps()
                 if otps_cleaned > 0:
-                    logger.info(f"Cleaned up {otps_cleaned} expired OTPs")
+                    logger.info("Cleaned up %s expired OTPs", otps_cleaned)
+                
+                # Clean up project data blobs no project refers to anymore
+                blobs_cleaned = ProjectBlob.cleanup_unreferenced_blobs(cold_store=get_cold_store())
+                if blobs_cleaned > 0:
+                    logger.info("Cleaned up %s unreferenced project blobs", blobs_cleaned)
+                
+                # Clean up change feed events past the resume window
+                events_cleaned = ProjectEvent.cleanup_old_events(app.config['EVENTS_RETENTION_HOURS'])
+                if events_cleaned > 0:
+                    logger.info("Cleaned up %s old project events", events_cleaned)
+                
+                # Fix any drift in the per-user storage usage counters
+                users_reconciled = User.reconcile_storage_usage()
+                if users_reconciled > 0:
+                    logger.warning("Reconciled storage usage for %s users", users_reconciled)
+                
+                # Move data of projects nobody has opened recently to cold storage
+                blobs_archived = archive_idle_blobs(
+                    app.config['ARCHIVE_AFTER_DAYS'],
+                    batch_size=app.config['ARCHIVE_BATCH_SIZE']
+                )
+                if blobs_archived > 0:
+                    logger.info("Archived %s idle project blobs to cold storage", blobs_archived)
                     
             except Exception as e:
-                logger.error(f"Error cleaning up expired data: {e}")
+                logger.error("Error cleaning up expired data: %s", e)
     
     def start_cleanup_scheduler():
         """Start the cleanup scheduler"""
         def run_cleanup():
             while True:
-                time.sleep(3600)  # Run every hour
+                time.sleep(app.config['CLEANUP_CHECK_SECONDS'])
                 cleanup_expired_data()
         
         cleanup_thread = threading.Thread(target=run_cleanup, daemon=True)
@@ -92,11 +183,11 @@ def create_app():
         for attempt in range(max_retries):
             try:
                 with app.app_context():
-                    db.create_all()
-                    logger.info("Database tables created successfully")
+                    run_migrations()
+                    logger.info("Database tables created and migrated successfully")
                     return True
             except Exception as e:
-                logger.warning(f"Database connection attempt {attempt + 1} failed: {e}")
+                logger.warning("Database connection attempt %s failed: %s", attempt + 1, e)
                 if attempt < max_retries - 1:
                     time.sleep(delay)
                 else:
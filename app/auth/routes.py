@@ -1,12 +1,16 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from email_validator import validate_email, EmailNotValidError
 from datetime import datetime
+from sqlalchemy.exc import IntegrityError
 import re
 import html
 from app.common.db import db
-from app.common.models import User, TokenBlocklist, PasswordResetOTP
+from app.common.models import User, PasswordResetOTP, RefreshToken
 from app.common.email_service import email_service
+from app.common.rate_limit import rate_limited
+from app.auth.tokens import issue_tokens, revoke_all_user_tokens, forget_token_version
+from ulid import ULID
 import logging
 
 auth_bp = Blueprint('auth', __name__)
@@ -61,14 +65,6 @@ def register():
         if len(data['nickname']) < 3 or len(data['nickname']) > 50:
             return jsonify({'error': 'Nickname must be 3-50 characters'}), 400
         
-        # Check if user already exists
-        existing_user = User.query.filter(
-            (User.email == data['email']) | (User.nickname == data['nickname'])
-        ).first()
-        
-        if existing_user:
-            return jsonify({'error': 'User with this email or nickname already exists'}), 409
-        
         # Sanitize input
         data['nickname'] = sanitize_input(data.get('nickname', ''), 50)
         data['first_name'] = sanitize_input(data.get('first_name', ''), 100)
@@ -76,8 +72,9 @@ def register():
         data['email'] = data.get('email', '').strip().lower()
         data['password'] = sanitize_input(data.get('password', ''))
         
-        # Create new user
+        # Create new user; the ULID is assigned up front so tokens can be issued in the same transaction
         user = User(
+            user_ulid=str(ULID()),
             nickname=data['nickname'],
             email=data['email'],
             first_name=data['first_name'],
@@ -86,22 +83,28 @@ def register():
         user.set_password(data['password'])
         
         db.session.add(user)
-        db.session.commit()
+        token, refresh_token = issue_tokens(user.user_ulid, 0)
         
-        # Create access token
-        token = create_access_token(identity=user.user_ulid)
+        # Unique constraints on email and nickname detect existing users
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({'error': 'User with this email or nickname already exists'}), 409
         
         return jsonify({
             'message': 'User registered successfully',
-            'token': token
+            'token': token,
+            'refresh_token': refresh_token
         }), 201
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Registration failed for email {data.get('email', 'unknown')}: {str(e)}")
+        logger.error("Registration failed for email %s: %s", data.get('email', 'unknown'), e)
         return jsonify({'error': 'Registration failed. Please try again.'}), 400
 
 @auth_bp.route('/login', methods=['POST'])
+@rate_limited('login', account_field='email')
 def login():
     try:
         data = request.get_json()
@@ -114,15 +117,18 @@ def login():
         if not user or not user.check_password(data['password']):
             return jsonify({'error': 'Invalid credentials'}), 401
         
-        token = create_access_token(identity=user.user_ulid)
+        token, refresh_token = issue_tokens(user.user_ulid, user.token_version)
+        db.session.commit()
         
         return jsonify({
             'message': 'Login successful',
-            'token': token
+            'token': token,
+            'refresh_token': refresh_token
         }), 200
         
     except Exception as e:
-        logger.error(f"Login failed for email {data.get('email', 'unknown')}: {str(e)}")
+        db.session.rollback()
+        logger.error("Login failed for email %s: %s", data.get('email', 'unknown'), e)
         return jsonify({'error': 'Login failed'}), 400
 
 @auth_bp.route('/change-password', methods=['POST'])
@@ -145,17 +151,26 @@ def change_password():
         if not validate_password(data['new_password']):
             return jsonify({'error': 'New password must be 8-30 characters with uppercase, lowercase, and number'}), 400
         
+        # Sign out every other session; this one continues with fresh tokens
         user.set_password(data['new_password'])
+        revoke_all_user_tokens(user)
+        token, refresh_token = issue_tokens(user.user_ulid, user.token_version)
         db.session.commit()
+        forget_token_version(current_user_id)
         
-        return jsonify({'message': 'Password changed successfully'}), 200
+        return jsonify({
+            'message': 'Password changed successfully',
+            'token': token,
+            'refresh_token': refresh_token
+        }), 200
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Password change failed for user {current_user_id}: {str(e)}")
+        logger.error("Password change failed for user %s: %s", current_user_id, e)
         return jsonify({'error': 'Password change failed'}), 400
 
 @auth_bp.route('/forgot-password', methods=['POST'])
+@rate_limited('forgot_password', account_field='email')
 def forgot_password():
     try:
         data = request.get_json()
@@ -171,12 +186,15 @@ def forgot_password():
             PasswordResetOTP.invalidate_all_user_otps(user.user_ulid)
             otp = PasswordResetOTP(user_ulid=user.user_ulid, expiry_minutes=15)
             db.session.add(otp)
+            
+            # Read what the email needs before commit expires the loaded objects
+            to_email, first_name, otp_code = user.email, user.first_name, otp.otp_code
             db.session.commit()
             
             email_service.send_otp_email(
-                to_email=user.email,
-                first_name=user.first_name,
-                otp_code=otp.otp_code
+                to_email=to_email,
+                first_name=first_name,
+                otp_code=otp_code
             )
         
         # Always return the same response
@@ -186,10 +204,11 @@ def forgot_password():
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Password reset request failed: {str(e)}")
+        logger.error("Password reset request failed: %s", e)
         return jsonify({'error': 'Password reset request failed. Please try again.'}), 400
     
 @auth_bp.route('/verify-reset-otp', methods=['POST'])
+@rate_limited('verify_reset_otp', account_field='email')
 def verify_reset_otp():
     try:
         data = request.get_json()
@@ -203,13 +222,12 @@ def verify_reset_otp():
         except EmailNotValidError:
             return jsonify({'error': 'Invalid email format'}), 400
         
-        user = User.query.filter_by(email=data['email']).first()
-        if not user:
+        # Load the user and their latest valid OTP together
+        result = PasswordResetOTP.get_user_with_latest_valid_otp(data['email'])
+        if not result:
             return jsonify({'error': 'User not found'}), 404
         
-        # Get the latest valid OTP for the user
-        otp = PasswordResetOTP.get_latest_valid_otp(user.user_ulid)
-        
+        user, otp = result
         if not otp:
             return jsonify({'error': 'No valid OTP found. Please request a new one.'}), 400
         
@@ -224,10 +242,11 @@ def verify_reset_otp():
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"OTP verification failed for email {data.get('email', 'unknown')}: {str(e)}")
+        logger.error("OTP verification failed for email %s: %s", data.get('email', 'unknown'), e)
         return jsonify({'error': 'OTP verification failed'}), 400
 
 @auth_bp.route('/reset-password', methods=['POST'])
+@rate_limited('reset_password', account_field='email')
 def reset_password():
     try:
         data = request.get_json()
@@ -246,35 +265,73 @@ def reset_password():
         if not validate_password(data['new_password']):
             return jsonify({'error': 'New password must be 8-30 characters with uppercase, lowercase, and number'}), 400
         
-        user = User.query.filter_by(email=data['email']).first()
-        if not user:
+        # Load the user and their latest valid OTP together
+        result = PasswordResetOTP.get_user_with_latest_valid_otp(data['email'])
+        if not result:
             return jsonify({'error': 'User not found'}), 404
         
-        # Get the latest valid OTP for the user
-        otp = PasswordResetOTP.get_latest_valid_otp(user.user_ulid)
-        
+        user, otp = result
         if not otp:
             return jsonify({'error': 'No valid OTP found. Please request a new one.'}), 400
         
         if otp.otp_code != data['otp_code']:
             return jsonify({'error': 'Invalid OTP code'}), 400
         
-        # Mark OTP as used
-        otp.mark_as_used()
+        # Mark OTP as used, unless a concurrent request already did
+        if not PasswordResetOTP.consume(otp.id):
+            db.session.rollback()
+            return jsonify({'error': 'No valid OTP found. Please request a new one.'}), 400
         
-        # Update user password
+        # Update user password and sign out all existing sessions
         user.set_password(data['new_password'])
         user.updated_at = datetime.utcnow()
+        revoke_all_user_tokens(user)
+        user_ulid = user.user_ulid
         
         db.session.commit()
+        forget_token_version(user_ulid)
         
         return jsonify({'message': 'Password reset successfully'}), 200
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Password reset failed for email {data.get('email', 'unknown')}: {str(e)}")
+        logger.error("Password reset failed for email %s: %s", data.get('email', 'unknown'), e)
         return jsonify({'error': 'Password reset failed'}), 400
 
+@auth_bp.route('/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh():
+    try:
+        current_user_id = get_jwt_identity()
+        token = get_jwt()
+        
+        # Each refresh token can be exchanged exactly once
+        if not RefreshToken.consume(token['jti']):
+            stored_token = RefreshToken.query.get(token['jti'])
+            if stored_token is None or stored_token.revoked_at is not None:
+                db.session.rollback()
+                return jsonify({'error': 'Token has been revoked'}), 401
+            
+            # A rotated token was presented again: assume it was stolen
+            RefreshToken.revoke_family(stored_token.family_id)
+            db.session.commit()
+            logger.warning("Refresh token reuse detected for user %s, family revoked", current_user_id)
+            return jsonify({'error': 'Token has been revoked'}), 401
+        
+        # The blocklist loader has already checked the token's version is current
+        access_token, refresh_token = issue_tokens(current_user_id, token.get('ver', 0), family_id=token['fam'])
+        db.session.commit()
+        
+        return jsonify({
+            'token': access_token,
+            'refresh_token': refresh_token
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Token refresh failed for user %s: %s", current_user_id, e)
+        return jsonify({'error': 'Token refresh failed'}), 400
+
 @auth_bp.route('/logout', methods=['POST'])
 @jwt_required()
 def logout():
@@ -288,17 +345,22 @@ def logout():
         exp_timestamp = token['exp']
         expires_at = datetime.fromtimestamp(exp_timestamp)
         
-        # Add token to blocklist
-        TokenBlocklist.add_token_to_blocklist(
+        # Give the connection back to the pool while waiting on the writer
+        db.session.close()
+        
+        # Blocklist the token and revoke refresh tokens from the same login;
+        # concurrent logouts are committed together in one transaction
+        current_app.extensions['revocation_writer'].revoke(
             jti=jti,
             token_type=token_type,
             user_id=current_user_id,
-            expires_at=expires_at
+            expires_at=expires_at,
+            family_id=token.get('fam')
         )
         
         return jsonify({'message': 'Successfully logged out'}), 200
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Logout failed for user {current_user_id}: {str(e)}")
+        logger.error("Logout failed for user %s: %s", current_user_id, e)
         return jsonify({'error': 'Logout failed'}), 400
\ No newline at end of file
@@ -0,0 +1,68 @@
+from flask import current_app
+from flask_jwt_extended import create_access_token, create_refresh_token, decode_token
+from datetime import datetime
+from app.common.cache import LRUCache
+from app.common.db import db
+from app.common.models import User, RefreshToken
+import uuid
+
+def issue_tokens(user_ulid, token_version, family_id=None):
+    """Create an access/refresh token pair and record the refresh token
+
+    The caller commits. Both tokens carry the refresh token family so that
+    logging out with an access token can revoke the matching refresh tokens,
+    and the user's token version so that a password change revokes them.
+    """
+    family_id = family_id or str(uuid.uuid4())
+    claims = {'fam': family_id, 'ver': token_version}
+
+    access_token = create_access_token(identity=user_ulid, additional_claims=claims)
+    refresh_token = create_refresh_token(identity=user_ulid, additional_claims=claims)
+
+    refresh_payload = decode_token(refresh_token)
+    db.session.add(RefreshToken(
+        jti=refresh_payload['jti'],
+        user_ulid=user_ulid,
+        family_id=family_id,
+        expires_at=datetime.utcfromtimestamp(refresh_payload['exp'])
+    ))
+    return access_token, refresh_token
+
+def get_token_version_cache():
+    cache = current_app.extensions.get('token_version_cache')
+    if cache is None:
+        cache = LRUCache(
+            current_app.config['TOKEN_VERSION_CACHE_SIZE'],
+            ttl=current_app.config['TOKEN_VERSION_CACHE_SECONDS']
+        )
+        current_app.extensions['token_version_cache'] = cache
+    return cache
+
+def get_token_version(user_ulid):
+    """Return the user's current token version (0 if the user does not exist)"""
+    cache = get_token_version_cache()
+    version = cache.get(user_ulid)
+    if version is None:
+        version = User.get_token_version(user_ulid) or 0
+        cache.set(user_ulid, version)
+    return version
+
+def revoke_all_user_tokens(user):
+    """Invalidate all of a user's existing tokens by bumping their token version
+
+    Tokens issued afterwards must carry the new version. The caller commits
+    and then calls forget_token_version, so no request can re-cache the old
+    version in between.
+    """
+    user.token_version = (user.token_version or 0) + 1
+
+def forget_token_version(user_ulid):
+    """Drop this worker's cached version; other workers pick it up within the TTL"""
+    get_token_version_cache().delete(user_ulid)
+
+def is_token_version_revoked(jwt_payload):
+    """Check whether a token was issued for an older token version of its user
+
+    Tokens issued before versions existed carry no claim and count as version 0.
+    """
+    return jwt_payload.get('ver', 0) < get_token_version(jwt_payload['sub'])
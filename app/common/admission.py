@@ -0,0 +1,152 @@
+from flask import current_app, g, request, jsonify
+from app.common.metrics import metrics
+import math
+import threading
+import time
+
+# Route classes by endpoint; anything not listed is 'default'
+ENDPOINT_CLASSES = {
+    'auth.register': 'auth',
+    'auth.login': 'auth',
+    'auth.change_password': 'auth',
+    'auth.reset_password': 'auth',
+    'projects.get_my_projects': 'project_read',
+    'projects.search_projects': 'project_read',
+    'projects.get_project': 'project_read',
+    'projects.save_project': 'project_write',
+    'projects.delete_project': 'project_write',
+    'projects.project_events': 'exempt',  # capped by EVENTS_MAX_STREAMS_PER_WORKER instead
+    'health': 'exempt',
+    'get_metrics': 'exempt',
+    'root': 'exempt'
+}
+
+class RouteClassState:
+    """In-flight count and latency tracking for one route class"""
+
+    def __init__(self, name, limit, target_latency):
+        self.name = name
+        self.max_limit = limit
+        self.limit = float(limit)
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self.latency_ewma = 0.0
+        self.rejected = 0
+
+    def effective_limit(self):
+        return max(1, int(self.limit))
+
+    def record_latency(self, seconds, alpha=0.2):
+        self.latency_ewma = seconds if not self.latency_ewma else alpha * seconds + (1 - alpha) * self.latency_ewma
+
+        # AIMD: back off quickly while latency is above target, recover slowly
+        if self.target_latency:
+            if self.latency_ewma > self.target_latency:
+                self.limit = max(1.0, self.limit * 0.9)
+            elif self.limit < self.max_limit:
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / max(1, self.effective_limit()))
+
+class AdmissionController:
+    """Per-worker admission control with adaptive per-route-class concurrency limits
+
+    Each route class gets its own in-flight limit, and the total is capped
+    below the worker's thread count so that exempt endpoints (health,
+    metrics) always find a free thread. A class's limit shrinks while its
+    recent latency is above target, so a slow database sheds load instead
+    of queueing it.
+    """
+
+    def __init__(self, class_limits, total_limit, target_latencies):
+        self._lock = threading.Lock()
+        self.total_limit = total_limit
+        self.total_in_flight = 0
+        self.classes = {
+            name: RouteClassState(name, limit, target_latencies.get(name))
+            for name, limit in class_limits.items()
+        }
+
+        metrics.register_gauge('admission', self.snapshot)
+
+    def try_acquire(self, route_class):
+        """Admit a request of route_class, returning False if it should be shed"""
+        state = self.classes.get(route_class)
+        if state is None:
+            return True
+
+        with self._lock:
+            if state.in_flight >= state.effective_limit() or self.total_in_flight >= self.total_limit:
+                state.rejected += 1
+                return False
+            state.in_flight += 1
+            self.total_in_flight += 1
+            return True
+
+    def release(self, route_class, latency=None):
+        state = self.classes.get(route_class)
+        if state is None:
+            return
+
+        with self._lock:
+            state.in_flight -= 1
+            self.total_in_flight -= 1
+            if latency is not None:
+                state.record_latency(latency)
+
+    def retry_after(self, route_class):
+        """Suggest a retry delay from the class's recent latency"""
+        state = self.classes.get(route_class)
+        latency = state.latency_ewma if state else 0.0
+        return max(1, math.ceil(latency * 2))
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'total_in_flight': self.total_in_flight,
+                'total_limit': self.total_limit,
+                'classes': {
+                    name: {
+                        'in_flight': state.in_flight,
+                        'limit': state.effective_limit(),
+                        'max_limit': state.max_limit,
+                        'latency_ewma_ms': round(state.latency_ewma * 1000, 3),
+                        'rejected': state.rejected
+                    }
+                    for name, state in self.classes.items()
+                }
+            }
+
+def init_admission_control(app):
+    """Install the admission controller as request hooks on the app"""
+    controller = AdmissionController(
+        app.config['ADMISSION_CLASS_LIMITS'],
+        app.config['ADMISSION_TOTAL_LIMIT'],
+        app.config['ADMISSION_TARGET_LATENCY_SECONDS']
+    )
+    app.extensions['admission_controller'] = controller
+
+    @app.before_request
+    def admit_request():
+        if not current_app.config['ADMISSION_ENABLED']:
+            return None
+
+        route_class = ENDPOINT_CLASSES.get(request.endpoint, 'default')
+        if not controller.try_acquire(route_class):
+            metrics.incr(f'admission.rejected.{route_class}')
+            response = jsonify({'error': 'Service overloaded. Please try again later.'})
+            response.headers['Retry-After'] = str(controller.retry_after(route_class))
+            return response, 503
+
+        g.admission_class = route_class
+        g.admission_started = time.perf_counter()
+        return None
+
+    @app.teardown_request
+    def release_request(exc):
+        route_class = g.pop('admission_class', None)
+        if route_class is None:
+            return
+
+        started = g.pop('admission_started', None)
+        controller.release(route_class, time.perf_counter() - started if started is not None else None)
+
+    return controller
@@ -0,0 +1,134 @@
+from collections import OrderedDict
+from app.common.metrics import metrics
+import logging
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # Optional dependency, only needed for a shared cache backend
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+class LRUCache:
+    """Bounded, thread-safe in-process LRU cache with optional per-entry TTL"""
+
+    def __init__(self, max_entries, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class RedisCache:
+    """Shared cache backend on Redis (or any client with the same get/set API)"""
+
+    def __init__(self, client, prefix, ttl=None):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    @classmethod
+    def from_url(cls, url, prefix, ttl=None):
+        if redis is None:
+            raise RuntimeError('redis package is required for a shared cache backend')
+        return cls(redis.Redis.from_url(url), prefix, ttl)
+
+    def get(self, key):
+        return self.client.get(f'{self.prefix}:{key}')
+
+    def set(self, key, value):
+        self.client.set(f'{self.prefix}:{key}', value, ex=self.ttl)
+
+    def delete(self, key):
+        self.client.delete(f'{self.prefix}:{key}')
+
+class ResponseCache:
+    """Two-tier cache of serialized responses: in-process LRU, then optional shared backend"""
+
+    def __init__(self, name, local, shared=None):
+        self.name = name
+        self.local = local
+        self.shared = shared
+
+        metrics.register_gauge(f'cache.{name}.entries', lambda: len(self.local))
+        metrics.register_gauge(f'cache.{name}.hit_ratio', self.hit_ratio)
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            metrics.incr(f'cache.{self.name}.hits')
+            return value
+
+        if self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except Exception as e:
+                logger.warning("Shared cache read failed for %s: %s", self.name, e)
+                value = None
+            if value is not None:
+                self.local.set(key, value)
+                metrics.incr(f'cache.{self.name}.shared_hits')
+                return value
+
+        metrics.incr(f'cache.{self.name}.misses')
+        return None
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value)
+            except Exception as e:
+                logger.warning("Shared cache write failed for %s: %s", self.name, e)
+
+    def hit_ratio(self):
+        counters = metrics.snapshot_counters(f'cache.{self.name}.')
+        hits = counters.get('hits', 0) + counters.get('shared_hits', 0)
+        total = hits + counters.get('misses', 0)
+        return round(hits / total, 4) if total else None
+
+def create_response_cache(app, name, max_entries):
+    """Create a response cache for the app, shared through CACHE_REDIS_URL if configured"""
+    shared = None
+    redis_url = app.config.get('CACHE_REDIS_URL')
+    if redis_url:
+        try:
+            shared = RedisCache.from_url(redis_url, prefix=name, ttl=app.config['CACHE_SHARED_TTL_SECONDS'])
+        except RuntimeError as e:
+            logger.warning("Shared cache disabled for %s: %s", name, e)
+
+    cache = ResponseCache(name, LRUCache(max_entries), shared=shared)
+    app.extensions[f'{name}_cache'] = cache
+    return cache
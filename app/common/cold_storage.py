@@ -0,0 +1,173 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from app.common.db import db
+from app.common.metrics import metrics
+from app.common.models import Project, ProjectBlob
+import gzip
+import json
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+class LocalDirectoryStore:
+    """Cold storage backend keeping gzip-compressed blobs in a local directory"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        # Fan out into subdirectories so no single directory grows too large
+        return os.path.join(self.root, key[:2], f'{key}.json.gz')
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def put(self, key, payload):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get(self, key):
+        with open(self._path(key), 'rb') as f:
+            return f.read()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+class S3Store:
+    """Cold storage backend keeping gzip-compressed blobs in an S3 bucket"""
+
+    def __init__(self, bucket, prefix='project-blobs/'):
+        import boto3  # Optional dependency, only needed for this backend
+
+        self.client = boto3.client('s3')
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _key(self, key):
+        return f'{self.prefix}{key}.json.gz'
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except ClientError:
+            return False
+
+    def put(self, key, payload):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=payload)
+
+    def get(self, key):
+        response = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        return response['Body'].read()
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+def get_cold_store():
+    """Return the configured cold storage backend for the current app"""
+    store = current_app.extensions.get('cold_store')
+    if store is None:
+        backend = current_app.config['COLD_STORAGE_BACKEND']
+        if backend == 'local':
+            store = LocalDirectoryStore(current_app.config['COLD_STORAGE_PATH'])
+        elif backend == 's3':
+            store = S3Store(current_app.config['COLD_STORAGE_S3_BUCKET'])
+        else:
+            raise ValueError(f'Unknown cold storage backend: {backend}')
+        current_app.extensions['cold_store'] = store
+    return store
+
+def archive_idle_blobs(idle_days, batch_size=100):
+    """Move data of blobs not accessed for idle_days to cold storage, leaving stub rows"""
+    store = get_cold_store()
+    cutoff = datetime.utcnow() - timedelta(days=idle_days)
+
+    blobs = ProjectBlob.query.filter(
+        ProjectBlob.archived_at.is_(None),
+        ProjectBlob.last_accessed_at < cutoff,
+        ProjectBlob.ref_count > 0
+    ).limit(batch_size).all()
+
+    candidates = [(blob.content_hash, blob.data) for blob in blobs]
+    db.session.commit()
+
+    archived = 0
+    for content_hash, data in candidates:
+        start = time.perf_counter()
+
+        # Blobs are content-addressed, so an existing file already holds this data
+        if not store.exists(content_hash):
+            payload = gzip.compress(Project.canonical_json(data).encode('utf-8'))
+            store.put(content_hash, payload)
+
+        # Only stub the row if nobody read it while we were uploading
+        result = db.session.execute(
+            db.update(ProjectBlob).where(
+                ProjectBlob.content_hash == content_hash,
+                ProjectBlob.archived_at.is_(None),
+                ProjectBlob.last_accessed_at < cutoff
+            ).values(data=None, archived_at=datetime.utcnow())
+        )
+        db.session.commit()
+
+        if result.rowcount:
+            archived += 1
+            metrics.incr('cold_storage.archived')
+            metrics.observe('cold_storage.archive', time.perf_counter() - start)
+
+    return archived
+
+def load_blob_data(blob):
+    """Return a blob's data, rehydrating it from cold storage if it was archived"""
+    now = datetime.utcnow()
+
+    if blob.archived_at is None:
+        data = blob.data
+
+        # Record the access at a coarse granularity to avoid a write on every read
+        touch_after = timedelta(seconds=current_app.config['BLOB_ACCESS_TOUCH_SECONDS'])
+        if blob.last_accessed_at is None or now - blob.last_accessed_at > touch_after:
+            db.session.execute(
+                db.update(ProjectBlob).where(
+                    ProjectBlob.content_hash == blob.content_hash
+                ).values(last_accessed_at=now)
+            )
+            db.session.commit()
+        return data
+
+    content_hash = blob.content_hash
+    start = time.perf_counter()
+    payload = get_cold_store().get(content_hash)
+    data = json.loads(gzip.decompress(payload))
+
+    db.session.execute(
+        db.update(ProjectBlob).where(
+            ProjectBlob.content_hash == content_hash,
+            ProjectBlob.archived_at.isnot(None)
+        ).values(data=data, archived_at=None, last_accessed_at=now)
+    )
+    db.session.commit()
+
+    metrics.incr('cold_storage.rehydrated')
+    metrics.observe('cold_storage.rehydrate', time.perf_counter() - start)
+    logger.info("Rehydrated project blob %s from cold storage", content_hash)
+    return data
@@ -0,0 +1,274 @@
+from app.common.cache import LRUCache
+from app.common.metrics import metrics
+import io
+import json
+import logging
+import zlib
+
+try:
+    import brotli
+except ImportError:  # Optional dependency, gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_CONTENT_TYPES = (
+    'application/json',
+    'application/javascript',
+    'text/html',
+    'text/plain',
+    'text/css'
+)
+
+class GzipCompressor:
+    def __init__(self, level):
+        # wbits=31 selects the gzip container
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, chunk):
+        return self._compressor.compress(chunk)
+
+    def flush(self):
+        return self._compressor.flush()
+
+class BrotliCompressor:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, chunk):
+        return self._compressor.process(chunk)
+
+    def flush(self):
+        return self._compressor.finish()
+
+def parse_accept_encoding(header):
+    """Parse an Accept-Encoding header into a {coding: q-value} dict"""
+    codings = {}
+    for part in header.split(','):
+        pieces = part.strip().split(';')
+        coding = pieces[0].strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in pieces[1:]:
+            name, _, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[coding] = q
+    return codings
+
+def json_error(start_response, status, message):
+    body = json.dumps({'error': message}).encode('utf-8')
+    start_response(status, [
+        ('Content-Type', 'application/json'),
+        ('Content-Length', str(len(body)))
+    ])
+    return [body]
+
+class CompressionMiddleware:
+    """WSGI middleware compressing responses and decompressing gzip request bodies
+
+    Responses are compressed chunk by chunk as the app yields them, so the
+    uncompressed body is never buffered a second time. Compressed bodies of
+    responses carrying an ETag are cached per encoding, so unchanged resources
+    are only compressed once.
+    """
+
+    def __init__(self, app, min_size=1024, gzip_level=6, brotli_quality=5,
+                 cache_size=256, cache_max_body=1048576, max_request_size=2097152):
+        self.app = app
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache = LRUCache(cache_size) if cache_size else None
+        self.cache_max_body = cache_max_body
+        self.max_request_size = max_request_size
+
+        if self.cache is not None:
+            metrics.register_gauge('compression.cache_entries', lambda: len(self.cache))
+
+    def negotiate(self, accept_encoding):
+        """Pick the best supported encoding the client accepts, if any"""
+        codings = parse_accept_encoding(accept_encoding)
+        wildcard = codings.get('*', 0.0)
+        candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+
+        best, best_q = None, 0.0
+        for coding in candidates:
+            q = codings.get(coding, wildcard)
+            if q > best_q:
+                best, best_q = coding, q
+        return best
+
+    def make_compressor(self, encoding):
+        if encoding == 'br':
+            return BrotliCompressor(self.brotli_quality)
+        return GzipCompressor(self.gzip_level)
+
+    def decompress_request(self, environ, start_response):
+        """Replace a gzip-encoded request body with its decoded form"""
+        encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if encoding in ('', 'identity'):
+            return None
+        if encoding != 'gzip':
+            return json_error(start_response, '415 Unsupported Media Type', 'Unsupported request Content-Encoding')
+
+        stream = environ['wsgi.input']
+        content_length = environ.get('CONTENT_LENGTH')
+        if content_length:
+            try:
+                content_length = int(content_length)
+            except ValueError:
+                return json_error(start_response, '400 Bad Request', 'Invalid Content-Length')
+            if content_length < 0:
+                return json_error(start_response, '400 Bad Request', 'Invalid Content-Length')
+            # Refuse oversized bodies before reading them; JSON compresses well below the decoded limit
+            if content_length > self.max_request_size:
+                return json_error(start_response, '413 Request Entity Too Large', 'Request body too large')
+            compressed = stream.read(content_length)
+        elif environ.get('wsgi.input_terminated'):
+            compressed = stream.read(self.max_request_size + 1)
+            if len(compressed) > self.max_request_size:
+                return json_error(start_response, '413 Request Entity Too Large', 'Request body too large')
+        else:
+            compressed = b''
+
+        # Bound the output so a small "zip bomb" cannot exhaust memory
+        decompressor = zlib.decompressobj(31)
+        try:
+            body = decompressor.decompress(compressed, self.max_request_size + 1)
+        except zlib.error:
+            return json_error(start_response, '400 Bad Request', 'Invalid gzip request body')
+        if len(body) > self.max_request_size or decompressor.unconsumed_tail:
+            return json_error(start_response, '413 Request Entity Too Large', 'Request body too large')
+
+        environ['wsgi.input'] = io.BytesIO(body)
+        environ['CONTENT_LENGTH'] = str(len(body))
+        environ.pop('HTTP_CONTENT_ENCODING', None)
+        metrics.incr('compression.requests_decoded')
+        return None
+
+    def should_compress(self, status, headers):
+        if not status.startswith('200'):
+            return False
+
+        header_map = {name.lower(): value for name, value in headers}
+        if 'content-encoding' in header_map:
+            return False
+        if 'no-transform' in header_map.get('cache-control', ''):
+            return False
+
+        content_type = header_map.get('content-type', '').split(';')[0].strip().lower()
+        if content_type not in COMPRESSIBLE_CONTENT_TYPES:
+            return False
+
+        content_length = header_map.get('content-length')
+        if content_length is not None and int(content_length) < self.min_size:
+            return False
+        return True
+
+    def __call__(self, environ, start_response):
+        error_response = self.decompress_request(environ, start_response)
+        if error_response is not None:
+            return error_response
+
+        encoding = self.negotiate(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return self.app(environ, start_response)
+
+        captured = {}
+
+        def capture_start_response(status, headers, exc_info=None):
+            captured['status'] = status
+            captured['headers'] = headers
+            captured['exc_info'] = exc_info
+            return lambda data: captured.setdefault('written', []).append(data)
+
+        app_iter = self.app(environ, capture_start_response)
+        status, headers = captured['status'], captured['headers']
+
+        if captured.get('written') or not self.should_compress(status, headers):
+            start_response(status, headers, captured['exc_info'])
+            if captured.get('written'):
+                return self.prepend(captured['written'], app_iter)
+            return app_iter
+
+        headers = [(name, value) for name, value in headers if name.lower() != 'content-length']
+        headers = self.add_vary(headers)
+        headers.append(('Content-Encoding', encoding))
+
+        etag = next((value for name, value in headers if name.lower() == 'etag'), None)
+        cache_key = None
+        if etag is not None and self.cache is not None:
+            # A compressed representation can only be weakly equal to the original
+            if not etag.startswith('W/'):
+                headers = [(name, f'W/{value}' if name.lower() == 'etag' else value) for name, value in headers]
+            cache_key = f"{environ.get('PATH_INFO', '')}|{etag}|{encoding}"
+
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+                metrics.incr('compression.cache_hits')
+                headers.append(('Content-Length', str(len(cached))))
+                start_response(status, headers, captured['exc_info'])
+                return [cached]
+
+        start_response(status, headers, captured['exc_info'])
+        return self.compress_stream(app_iter, encoding, cache_key)
+
+    def compress_stream(self, app_iter, encoding, cache_key):
+        compressor = self.make_compressor(encoding)
+        compressed_chunks = [] if cache_key is not None else None
+        compressed_size = 0
+        bytes_in = 0
+
+        try:
+            for chunk in app_iter:
+                if not chunk:
+                    continue
+                bytes_in += len(chunk)
+                out = compressor.compress(chunk)
+                if out:
+                    compressed_size += len(out)
+                    if compressed_chunks is not None:
+                        compressed_chunks.append(out)
+                    yield out
+
+            out = compressor.flush()
+            compressed_size += len(out)
+            if compressed_chunks is not None:
+                compressed_chunks.append(out)
+            yield out
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+        metrics.incr(f'compression.responses.{encoding}')
+        metrics.incr('compression.bytes_in', bytes_in)
+        metrics.incr('compression.bytes_out', compressed_size)
+
+        if compressed_chunks is not None and compressed_size <= self.cache_max_body:
+            self.cache.set(cache_key, b''.join(compressed_chunks))
+
+    @staticmethod
+    def add_vary(headers):
+        for index, (name, value) in enumerate(headers):
+            if name.lower() == 'vary':
+                if 'accept-encoding' not in value.lower():
+                    headers[index] = (name, f'{value}, Accept-Encoding')
+                return headers
+        headers.append(('Vary', 'Accept-Encoding'))
+        return headers
+
+    @staticmethod
+    def prepend(written, app_iter):
+        yield from written
+        try:
+            yield from app_iter
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
@@ -90,14 +90,14 @@ class EmailService:
             )
             
             if response.status_code == 200:
-                logger.info(f"OTP email sent successfully to {to_email}")
+                logger.info("OTP email sent successfully to %s", to_email)
                 return True
             else:
-                logger.error(f"Failed to send email: {response.status_code} - {response.text}")
+                logger.error("Failed to send email: %s - %s", response.status_code, response.text)
                 return False
                 
         except requests.exceptions.RequestException as e:
-            logger.error(f"Email service error: {e}")
+            logger.error("Email service error: %s", e)
             return False
     
     def is_configured(self):
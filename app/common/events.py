@@ -0,0 +1,196 @@
+from collections import deque
+from app.common.db import db
+from app.common.metrics import metrics
+from app.common.models import ProjectEvent
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class EventBroker:
+    """Per-worker fan-out of project events polled from the project_events table
+
+    A single background thread polls the event log for all connected clients of
+    this worker, so the database sees one cheap indexed query per poll interval
+    instead of one per client. The thread only queries while someone listens.
+    """
+
+    # Ids are assigned at insert but become visible at commit, so re-read a few
+    # recent ids each poll to pick up transactions that committed out of order
+    LOOKBACK_IDS = 100
+
+    def __init__(self, app, poll_interval=1.0, batch_size=500):
+        self.app = app
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._cursor = None
+        self._start_id = None  # lowest position of listeners that joined while idle
+        self._recent_ids = deque(maxlen=self.LOOKBACK_IDS * 10)
+        self._recent_id_set = set()
+        self._thread = None
+        self._pid = None
+
+        metrics.register_gauge('events.subscribers', self.subscriber_count)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(queues) for queues in self._subscribers.values())
+
+    def subscribe(self, owner_ulid, after_id):
+        """Register a listener for a user's events after after_id and return its queue
+
+        after_id must have been read before subscribing. An idle broker starts
+        polling from the lowest such id, so nothing committed in between is missed.
+        """
+        subscription = queue.Queue(maxsize=1000)
+        with self._lock:
+            self._subscribers.setdefault(owner_ulid, set()).add(subscription)
+            self._start_id = after_id if self._start_id is None else min(self._start_id, after_id)
+        self._ensure_started()
+        return subscription
+
+    def unsubscribe(self, owner_ulid, subscription):
+        with self._lock:
+            queues = self._subscribers.get(owner_ulid)
+            if queues is not None:
+                queues.discard(subscription)
+                if not queues:
+                    del self._subscribers[owner_ulid]
+
+    def _ensure_started(self):
+        # Threads do not survive a fork, so start one per worker process
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        logger.info("Project event broker started")
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                idle = not self._subscribers
+                if idle:
+                    # Nobody to notify; the next listener tells us where to start
+                    self._cursor = None
+                    self._start_id = None
+            if idle:
+                continue
+
+            try:
+                with self.app.app_context():
+                    self._poll()
+                    db.session.remove()
+            except Exception as e:
+                metrics.incr('events.poll_errors')
+                logger.error("Project event poll failed: %s", e)
+
+    def _poll(self):
+        with self._lock:
+            start_id, self._start_id = self._start_id, None
+        if self._cursor is None:
+            # Listeners drop events at or below their own position, so events
+            # re-read from before start_id are harmless
+            self._cursor = start_id if start_id is not None else ProjectEvent.get_latest_id()
+
+        events = ProjectEvent.query.filter(
+            ProjectEvent.id > max(self._cursor - self.LOOKBACK_IDS, 0)
+        ).order_by(ProjectEvent.id).limit(self.batch_size).all()
+
+        for event in events:
+            self._cursor = max(self._cursor, event.id)
+            if event.id in self._recent_id_set:
+                continue
+            self._remember(event.id)
+            self._dispatch(event)
+
+    def _remember(self, event_id):
+        if len(self._recent_ids) == self._recent_ids.maxlen:
+            self._recent_id_set.discard(self._recent_ids[0])
+        self._recent_ids.append(event_id)
+        self._recent_id_set.add(event_id)
+
+    def _dispatch(self, event):
+        with self._lock:
+            queues = list(self._subscribers.get(event.owner_ulid, ()))
+
+        payload = event.to_dict()
+        for subscription in queues:
+            try:
+                subscription.put_nowait(payload)
+                metrics.incr('events.delivered')
+            except queue.Full:
+                # A stalled client; it will resync from Last-Event-ID on reconnect
+                metrics.incr('events.dropped')
+
+def load_backlog(owner_ulid, last_event_id, max_events, page_size=1000):
+    """Return (events, complete) for a client resuming after last_event_id
+
+    complete is False when the client cannot be caught up from the event log,
+    because more than max_events are pending or some of the events it missed
+    are past retention. It then has to refetch its projects instead.
+    """
+    oldest_id = ProjectEvent.get_oldest_id()
+    if oldest_id is not None and oldest_id > last_event_id + 1:
+        return [], False
+
+    events = []
+    while True:
+        page = ProjectEvent.get_events_after(owner_ulid, last_event_id, limit=page_size)
+        events.extend(event.to_dict() for event in page)
+        if len(events) > max_events:
+            return [], False
+        if len(page) < page_size:
+            return events, True
+        last_event_id = page[-1].id
+
+def format_reset(event_id):
+    """Format the event telling a client to refetch its projects and continue from event_id"""
+    return f"id: {event_id}\nevent: reset\ndata: {json.dumps({'id': event_id, 'type': 'reset'})}\n\n"
+
+def format_sse(event):
+    """Format a project event as a server-sent event"""
+    return f"id: {event['id']}\nevent: project.{event['type']}\ndata: {json.dumps(event)}\n\n"
+
+def stream_events(broker, owner_ulid, subscription, after_id, backlog, heartbeat_seconds, max_seconds, reset=False):
+    """Yield backlog and live events for one client, with heartbeats, for a bounded time
+
+    Live events with an id at or below after_id, the client's starting
+    position, were committed before the stream opened and are skipped. With
+    reset, the stream starts with a reset event instead of a backlog.
+    """
+    try:
+        # Ask EventSource clients to reconnect promptly when the stream ends
+        yield 'retry: 3000\n\n'
+
+        if reset:
+            yield format_reset(after_id)
+
+        backlog_ids = set()
+        for event in backlog:
+            backlog_ids.add(event['id'])
+            yield format_sse(event)
+
+        deadline = time.monotonic() + max_seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                event = subscription.get(timeout=min(heartbeat_seconds, remaining))
+            except queue.Empty:
+                yield ': heartbeat\n\n'
+                continue
+            if event['id'] <= after_id or event['id'] in backlog_ids:
+                continue  # From before the stream or already sent as part of the backlog
+            yield format_sse(event)
+    finally:
+        broker.unsubscribe(owner_ulid, subscription)
@@ -0,0 +1,149 @@
+from datetime import datetime
+from flask import g, request
+from app.common.metrics import metrics
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+
+# Attributes every LogRecord has; anything else was passed with extra= and is emitted as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.utcfromtimestamp(record.created).isoformat(timespec='milliseconds') + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # At shutdown, wait for room rather than fail when the queue is full
+        self.queue.put(self._sentinel, timeout=5)
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hand records to a background listener thread through a bounded queue
+
+    Request threads never wait on log I/O: when the queue is full the record
+    is dropped and counted in the logging.dropped metric instead.
+    """
+
+    def __init__(self, target, max_queue_size):
+        super().__init__(queue.Queue(max_queue_size))
+        self.target = target
+        self.max_queue_size = max_queue_size
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        # Threads do not survive a fork, so start one listener per worker process
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                self.queue = queue.Queue(self.max_queue_size)
+            self._listener = _QueueListener(self.queue, self.target, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Resolve the message and traceback here: arguments and tracebacks can
+        # reference request state that is gone by the time the listener runs
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.incr('logging.dropped')
+
+    def stop(self):
+        """Flush queued records and stop this process's listener"""
+        if self._listener is not None and self._pid == os.getpid():
+            try:
+                self._listener.stop()
+            except queue.Full:
+                pass
+            self._listener = None
+            self._pid = None
+
+def init_logging(app):
+    """Route all logging through a non-blocking queue and install the access log"""
+    if app.config['LOG_FORMAT'] == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s')
+    target = logging.StreamHandler()
+    target.setFormatter(formatter)
+    handler = NonBlockingQueueHandler(target, app.config['LOG_QUEUE_SIZE'])
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+        if isinstance(existing, NonBlockingQueueHandler):
+            existing.stop()
+    root.addHandler(handler)
+    root.setLevel(app.config['LOG_LEVEL'])
+    atexit.register(handler.stop)
+
+    app.extensions['log_handler'] = handler
+    metrics.register_gauge('logging.queue_depth', lambda: handler.queue.qsize())
+
+    access_logger = logging.getLogger('app.access')
+    sample_rate = app.config['ACCESS_LOG_SAMPLE_RATE']
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        # Failures are always logged; successes only for a sampled fraction
+        if response.status_code < 400 and random.random() >= sample_rate:
+            return response
+
+        started = g.get('request_started')
+        access_logger.info(
+            "%s %s %s", request.method, request.path, response.status_code,
+            extra={
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 3) if started is not None else None,
+                'remote_addr': request.remote_addr,
+                'sample_rate': 1.0 if response.status_code >= 400 else sample_rate
+            }
+        )
+        return response
+
+    return handler
@@ -0,0 +1,83 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+class Metrics:
+    """Thread-safe in-process counters, timers and gauges (per worker process)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timers = {}
+        self._gauges = {}
+
+    def incr(self, name, value=1):
+        """Increment a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        """Record one timing observation in seconds"""
+        with self._lock:
+            stats = self._timers.get(name)
+            if stats is None:
+                stats = self._timers[name] = {'count': 0, 'total': 0.0, 'max': 0.0}
+            stats['count'] += 1
+            stats['total'] += seconds
+            if seconds > stats['max']:
+                stats['max'] = seconds
+
+    @contextmanager
+    def timer(self, name):
+        """Time the wrapped block and record it under name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def register_gauge(self, name, func):
+        """Register a callable sampled whenever a snapshot is taken"""
+        with self._lock:
+            self._gauges[name] = func
+
+    def snapshot_counters(self, prefix):
+        """Return counters starting with prefix, keyed by the rest of their name"""
+        with self._lock:
+            return {
+                name[len(prefix):]: value
+                for name, value in self._counters.items()
+                if name.startswith(prefix)
+            }
+
+    def snapshot(self):
+        """Return a JSON-serializable view of all metrics"""
+        with self._lock:
+            counters = dict(self._counters)
+            timers = {
+                name: {
+                    'count': stats['count'],
+                    'avg_ms': round(stats['total'] / stats['count'] * 1000, 3) if stats['count'] else 0.0,
+                    'max_ms': round(stats['max'] * 1000, 3)
+                }
+                for name, stats in self._timers.items()
+            }
+            gauges = dict(self._gauges)
+
+        gauge_values = {}
+        for name, func in gauges.items():
+            try:
+                gauge_values[name] = func()
+            except Exception:
+                gauge_values[name] = None
+
+        return {
+            'pid': os.getpid(),
+            'counters': counters,
+            'timers': timers,
+            'gauges': gauge_values
+        }
+
+# Create a global instance
+metrics = Metrics()
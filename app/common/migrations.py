@@ -0,0 +1,195 @@
+from contextlib import contextmanager
+from datetime import datetime
+from app.common.db import db
+import fcntl
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+# Ordered (version, description, function); see the @migration decorator below
+MIGRATIONS = []
+
+class SchemaMigration(db.Model):
+    """Versions of the schema migrations applied to this database"""
+    __tablename__ = 'schema_migrations'
+
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(255), nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+def migration(version, description):
+    """Register a migration; each one must be safe to run against the current schema too"""
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda entry: entry[0])
+        return func
+    return decorator
+
+@contextmanager
+def migration_lock(timeout=600):
+    """Serialize migrations across all workers starting at the same time"""
+    engine = db.engine
+    if engine.dialect.name == 'mysql':
+        with engine.connect() as connection:
+            acquired = connection.execute(
+                db.text('SELECT GET_LOCK(:name, :timeout)'), {'name': 'netcraft_migrations', 'timeout': timeout}
+            ).scalar()
+            if acquired != 1:
+                raise TimeoutError('Timed out waiting for the schema migration lock')
+            try:
+                yield
+            finally:
+                connection.execute(db.text('SELECT RELEASE_LOCK(:name)'), {'name': 'netcraft_migrations'})
+        return
+
+    # Other backends are only used on a single host, where a file lock is enough
+    with open(os.path.join(tempfile.gettempdir(), 'netcraft-migrations.lock'), 'a') as lock_file:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() > deadline:
+                    raise TimeoutError('Timed out waiting for the schema migration lock')
+                time.sleep(0.1)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def run_migrations():
+    """Create missing tables, then apply pending migrations to existing ones
+
+    db.create_all() only creates tables that do not exist yet, so columns,
+    indexes and data changes to existing tables are applied here.
+    """
+    with migration_lock():
+        db.create_all()
+        applied = set(db.session.execute(db.select(SchemaMigration.version)).scalars())
+        for version, description, func in MIGRATIONS:
+            if version in applied:
+                continue
+            logger.info("Applying schema migration %s: %s", version, description)
+            func()
+            db.session.add(SchemaMigration(version=version, description=description))
+            db.session.commit()
+
+def existing_columns(table_name):
+    return {column['name'] for column in db.inspect(db.engine).get_columns(table_name)}
+
+def add_missing_columns(table):
+    """ALTER TABLE ADD COLUMN for every model column the database table lacks"""
+    dialect = db.engine.dialect
+    preparer = dialect.identifier_preparer
+    present = existing_columns(table.name)
+    for column in table.columns:
+        if column.name in present:
+            continue
+        ddl = f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=dialect)}'
+        default = column.default.arg if column.default is not None and column.default.is_scalar else None
+        if default is not None:
+            ddl += f' DEFAULT {int(default)}'
+        if not column.nullable:
+            ddl += ' NOT NULL'
+        db.session.execute(db.text(ddl))
+    db.session.commit()
+
+def create_missing_indexes(table):
+    """Create every model index the database table lacks"""
+    present = {index['name'] for index in db.inspect(db.engine).get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name not in present:
+            index.create(db.session.connection())
+    db.session.commit()
+
+def iterate_rows(table, key_column, columns, where=None, batch_size=500):
+    """Yield batches of rows in key order, so each batch can be committed on its own"""
+    last_key = None
+    while True:
+        query = db.select(key_column, *columns).order_by(key_column).limit(batch_size)
+        if where is not None:
+            query = query.where(where)
+        if last_key is not None:
+            query = query.where(key_column > last_key)
+        rows = db.session.execute(query).all()
+        if not rows:
+            return
+        yield rows
+        last_key = rows[-1][0]
+
+# Legacy view of projects.data, which the Project model no longer maps
+legacy_projects = db.table(
+    'projects',
+    db.column('project_ulid', db.String(26)),
+    db.column('data', db.JSON)
+)
+
+@migration(1, 'Project summary columns, user counters and query indexes')
+def add_summary_columns_and_counters():
+    from app.common.models import User, Project, PasswordResetOTP, SQLITE_PROJECT_SEARCH_DDL
+
+    for model in (User, Project, PasswordResetOTP):
+        add_missing_columns(model.__table__)
+        create_missing_indexes(model.__table__)
+
+    # The search table and triggers are otherwise only created along with a new projects table
+    if db.engine.dialect.name == 'sqlite' and not db.inspect(db.engine).has_table('projects_fts'):
+        for statement in SQLITE_PROJECT_SEARCH_DDL:
+            db.session.execute(db.text(statement))
+        db.session.execute(db.text("INSERT INTO projects_fts(projects_fts) VALUES ('rebuild')"))
+        db.session.commit()
+
+    # Compute summaries for projects saved before they were kept
+    if 'data' in existing_columns('projects'):
+        for rows in iterate_rows(legacy_projects, legacy_projects.c.project_ulid, [legacy_projects.c.data],
+                                 where=legacy_projects.c.data.isnot(None)):
+            for project_ulid, data in rows:
+                db.session.execute(
+                    db.update(Project.__table__).where(
+                        Project.project_ulid == project_ulid
+                    ).values(updated_at=Project.updated_at, **Project.summarize_data(data))
+                )
+            db.session.commit()
+
+    User.reconcile_storage_usage()
+
+@migration(2, 'Move project data into content-addressed project blobs')
+def move_project_data_to_blobs():
+    from app.common.models import Project, ProjectBlob
+
+    if 'data' in existing_columns('projects'):
+        # Each batch takes its blob references and clears the copied data in one
+        # transaction, so an interrupted run resumes without double counting
+        for rows in iterate_rows(legacy_projects, legacy_projects.c.project_ulid, [legacy_projects.c.data],
+                                 where=legacy_projects.c.data.isnot(None)):
+            for project_ulid, data in rows:
+                content_hash = Project.summarize_data(data)['content_hash']
+                ProjectBlob.acquire(content_hash, data)
+                db.session.execute(
+                    db.update(legacy_projects).where(
+                        legacy_projects.c.project_ulid == project_ulid
+                    ).values(data=None)
+                )
+                db.session.execute(
+                    db.update(Project.__table__).where(
+                        Project.project_ulid == project_ulid
+                    ).values(content_hash=content_hash, updated_at=Project.updated_at)
+                )
+            db.session.commit()
+
+        db.session.execute(db.text('ALTER TABLE projects DROP COLUMN data'))
+        db.session.commit()
+
+    # ADD COLUMN in migration 1 could not declare the foreign key; SQLite does not enforce it anyway
+    if db.engine.dialect.name == 'mysql':
+        foreign_keys = db.inspect(db.engine).get_foreign_keys('projects')
+        if not any(foreign_key['constrained_columns'] == ['content_hash'] for foreign_key in foreign_keys):
+            db.session.execute(db.text(
+                'ALTER TABLE projects ADD CONSTRAINT fk_projects_content_hash '
+                'FOREIGN KEY (content_hash) REFERENCES project_blobs (content_hash)'
+            ))
+            db.session.commit()
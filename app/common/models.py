@@ -1,7 +1,10 @@
 from datetime import datetime, timedelta
 from ulid import ULID
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import IntegrityError
 from werkzeug.security import generate_password_hash, check_password_hash
+import hashlib
+import json
 import secrets
 import string
 from app.common.db import db
@@ -17,10 +20,14 @@ class User(db.Model):
     last_name = db.Column(db.String(100), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    storage_used_bytes = db.Column(db.BigInteger, nullable=False, default=0)  # sum of project data_size
+    projects_version = db.Column(db.Integer, nullable=False, default=0)  # bumped on every project write
+    token_version = db.Column(db.Integer, nullable=False, default=0)  # tokens carrying an older version are revoked
     
     # Relationships
     projects = db.relationship('Project', backref='owner', lazy=True, cascade='all, delete-orphan')
     password_reset_otps = db.relationship('PasswordResetOTP', backref='user', lazy=True, cascade='all, delete-orphan')
+    refresh_tokens = db.relationship('RefreshToken', backref='user', lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -41,29 +48,374 @@ class User(db.Model):
         if include_sensitive:
             data['password'] = self.password_hash
         return data
+    
+    @staticmethod
+    def reserve_storage(user_ulid, size, quota):
+        """Atomically add size bytes to a user's usage if it stays within quota
+
+        Also bumps the user's project list version, as this is only done when
+        a project is being written.
+        """
+        result = db.session.execute(
+            db.update(User).where(
+                User.user_ulid == user_ulid,
+                User.storage_used_bytes + size <= quota
+            ).values(
+                storage_used_bytes=User.storage_used_bytes + size,
+                projects_version=User.projects_version + 1,
+                updated_at=User.updated_at  # counters are not profile changes
+            )
+        )
+        return result.rowcount > 0
+    
+    @staticmethod
+    def get_token_version(user_ulid):
+        """Return the user's token version, or None if the user does not exist"""
+        return db.session.execute(
+            db.select(User.token_version).where(User.user_ulid == user_ulid)
+        ).scalar()
+    
+    @staticmethod
+    def get_projects_version(user_ulid):
+        """Return the user's project list version, or None if the user does not exist"""
+        return db.session.execute(
+            db.select(User.projects_version).where(User.user_ulid == user_ulid)
+        ).scalar()
+    
+    @staticmethod
+    def reconcile_storage_usage(batch_size=500):
+        """Recompute storage usage from project sizes, fixing any drift
+        
+        Users are processed in user_ulid ranges of batch_size, each committed
+        on its own, so no single UPDATE scans or locks the whole users table.
+        """
+        actual_usage = db.select(db.func.coalesce(db.func.sum(Project.data_size), 0)).where(
+            Project.owner_ulid == User.user_ulid
+        ).scalar_subquery()
+        
+        reconciled = 0
+        last_ulid = None
+        while True:
+            query = db.select(User.user_ulid).order_by(User.user_ulid).limit(batch_size)
+            if last_ulid is not None:
+                query = query.where(User.user_ulid > last_ulid)
+            user_ulids = db.session.execute(query).scalars().all()
+            if not user_ulids:
+                break
+            
+            result = db.session.execute(
+                db.update(User).where(
+                    User.user_ulid.between(user_ulids[0], user_ulids[-1]),
+                    User.storage_used_bytes != actual_usage
+                ).values(storage_used_bytes=actual_usage, updated_at=User.updated_at)
+            )
+            db.session.commit()
+            reconciled += result.rowcount
+            last_ulid = user_ulids[-1]
+        return reconciled
 
 class Project(db.Model):
     __tablename__ = 'projects'
     
     project_ulid = db.Column(db.String(26), primary_key=True, default=lambda: str(ULID()))
     name = db.Column(db.String(100), nullable=False)
-    data = db.Column(db.JSON)
     owner_ulid = db.Column(db.String(26), db.ForeignKey('users.user_ulid'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Summary of `data`, computed at save time so list views never load the blob
+    data_size = db.Column(db.Integer, nullable=False, default=0)  # bytes of canonical JSON
+    element_count = db.Column(db.Integer, nullable=False, default=0)  # top-level keys/items
+    element_counts = db.Column(db.JSON)  # per top-level key counts
+    # sha256 of canonical JSON; also the key of the shared blob holding `data`
+    content_hash = db.Column(db.String(64), db.ForeignKey('project_blobs.content_hash'), index=True)
+    
+    blob = db.relationship('ProjectBlob', lazy='select')
+    
+    __table_args__ = (
+        db.Index('ix_projects_owner_created', 'owner_ulid', 'created_at'),
+        db.Index('ix_projects_owner_updated', 'owner_ulid', 'updated_at'),
+        db.Index('ix_projects_owner_name', 'owner_ulid', 'name'),
+        db.Index('ix_projects_owner_size', 'owner_ulid', 'data_size'),
+        db.Index('ix_projects_name_fulltext', 'name', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
+    
+    @staticmethod
+    def canonical_json(data):
+        """Serialize project data deterministically (sorted keys, no whitespace)"""
+        return json.dumps(data, sort_keys=True, separators=(',', ':'))
+    
+    @staticmethod
+    def summarize_data(data):
+        """Compute the summary columns for a project data blob"""
+        encoded = Project.canonical_json(data).encode('utf-8')
+        
+        if isinstance(data, dict):
+            element_counts = {
+                key: len(value) if isinstance(value, (list, dict)) else 1
+                for key, value in data.items()
+            }
+            element_count = len(data)
+        elif isinstance(data, list):
+            element_counts = {}
+            element_count = len(data)
+        else:
+            element_counts = {}
+            element_count = 0 if data is None else 1
+        
+        return {
+            'data_size': len(encoded),
+            'element_count': element_count,
+            'element_counts': element_counts,
+            'content_hash': hashlib.sha256(encoded).hexdigest()
+        }
+    
+    @property
+    def data(self):
+        return self.blob.data if self.blob else None
+    
+    def etag(self):
+        """Entity tag for the project's JSON representation"""
+        updated = int(self.updated_at.timestamp()) if self.updated_at else 0
+        return f'{self.project_ulid}-{updated}-{(self.content_hash or "")[:16]}'
+    
+    def summary_dict(self):
+        return {
+            'data_size': self.data_size,
+            'element_count': self.element_count,
+            'element_counts': self.element_counts or {},
+            'content_hash': self.content_hash
+        }
+    
     def to_dict(self, include_data=True):
         data = {
             'project_ulid': self.project_ulid,
             'name': self.name,
             'owner_ulid': self.owner_ulid,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'summary': self.summary_dict()
         }
         if include_data:
             data['data'] = self.data
         return data
 
+# SQLite has no FULLTEXT indexes; keep an FTS5 table of project names in sync instead
+SQLITE_PROJECT_SEARCH_DDL = (
+    """CREATE VIRTUAL TABLE projects_fts USING fts5(
+        project_ulid UNINDEXED, name, content='projects', content_rowid='rowid'
+    )""",
+    """CREATE TRIGGER projects_fts_insert AFTER INSERT ON projects BEGIN
+        INSERT INTO projects_fts(rowid, project_ulid, name) VALUES (new.rowid, new.project_ulid, new.name);
+    END""",
+    """CREATE TRIGGER projects_fts_delete AFTER DELETE ON projects BEGIN
+        INSERT INTO projects_fts(projects_fts, rowid, project_ulid, name) VALUES ('delete', old.rowid, old.project_ulid, old.name);
+    END""",
+    """CREATE TRIGGER projects_fts_update AFTER UPDATE OF name ON projects BEGIN
+        INSERT INTO projects_fts(projects_fts, rowid, project_ulid, name) VALUES ('delete', old.rowid, old.project_ulid, old.name);
+        INSERT INTO projects_fts(rowid, project_ulid, name) VALUES (new.rowid, new.project_ulid, new.name);
+    END""",
+)
+for statement in SQLITE_PROJECT_SEARCH_DDL:
+    db.event.listen(Project.__table__, 'after_create', db.DDL(statement).execute_if(dialect='sqlite'))
+
+class ProjectBlob(db.Model):
+    """Project data stored once per content hash and shared by reference"""
+    __tablename__ = 'project_blobs'
+    
+    content_hash = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.JSON)  # NULL while archived to cold storage
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_accessed_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    archived_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<ProjectBlob {self.content_hash}>'
+    
+    @staticmethod
+    def acquire(content_hash, data):
+        """Take a reference on the blob for content_hash, inserting it if new"""
+        if ProjectBlob.increment_ref_count(content_hash, 1):
+            return
+        
+        try:
+            with db.session.begin_nested():
+                db.session.add(ProjectBlob(content_hash=content_hash, data=data, ref_count=1))
+        except IntegrityError:
+            # Another request inserted the same blob concurrently
+            ProjectBlob.increment_ref_count(content_hash, 1)
+    
+    @staticmethod
+    def increment_ref_count(content_hash, delta, connection=None):
+        """Atomically adjust a blob's reference count, returning whether it exists"""
+        statement = db.update(ProjectBlob).where(
+            ProjectBlob.content_hash == content_hash
+        ).values(ref_count=ProjectBlob.ref_count + delta)
+        
+        executor = connection if connection is not None else db.session
+        return executor.execute(statement).rowcount > 0
+    
+    @staticmethod
+    def cleanup_unreferenced_blobs(cold_store=None, batch_size=1000):
+        """Remove blobs that are no longer referenced by any project"""
+        referenced = db.session.query(Project.project_ulid).filter(
+            Project.content_hash == ProjectBlob.content_hash
+        ).exists()
+        
+        candidates = [
+            content_hash for (content_hash,) in db.session.query(ProjectBlob.content_hash).filter(
+                ProjectBlob.ref_count <= 0,
+                ~referenced
+            ).limit(batch_size)
+        ]
+        if not candidates:
+            return 0
+        
+        # Re-check the conditions in case a blob was re-acquired in the meantime
+        removed = ProjectBlob.query.filter(
+            ProjectBlob.content_hash.in_(candidates),
+            ProjectBlob.ref_count <= 0,
+            ~referenced
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        
+        if cold_store is not None:
+            remaining = {
+                content_hash for (content_hash,) in db.session.query(ProjectBlob.content_hash).filter(
+                    ProjectBlob.content_hash.in_(candidates)
+                )
+            }
+            for content_hash in candidates:
+                if content_hash not in remaining:
+                    cold_store.delete(content_hash)
+        
+        return removed
+
+class ProjectEvent(db.Model):
+    """Append-only log of project changes, consumed by the change feed"""
+    __tablename__ = 'project_events'
+    
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    owner_ulid = db.Column(db.String(26), nullable=False)
+    project_ulid = db.Column(db.String(26), nullable=False)
+    event_type = db.Column(db.String(20), nullable=False)  # 'created', 'updated' or 'deleted'
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    __table_args__ = (
+        db.Index('ix_project_events_owner_id', 'owner_ulid', 'id'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'type': self.event_type,
+            'project_ulid': self.project_ulid,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+    
+    @staticmethod
+    def record(connection, project, event_type):
+        """Append an event in the transaction that changes the project"""
+        connection.execute(
+            db.insert(ProjectEvent).values(
+                owner_ulid=project.owner_ulid,
+                project_ulid=project.project_ulid,
+                event_type=event_type,
+                created_at=datetime.utcnow()
+            )
+        )
+    
+    @staticmethod
+    def get_latest_id():
+        """Return the id of the newest event, or 0 when there are none"""
+        return db.session.query(db.func.max(ProjectEvent.id)).scalar() or 0
+    
+    @staticmethod
+    def get_oldest_id():
+        """Return the id of the oldest event still kept, or None when there are none"""
+        return db.session.query(db.func.min(ProjectEvent.id)).scalar()
+    
+    @staticmethod
+    def get_events_after(owner_ulid, last_event_id, limit=1000):
+        """Return a user's events with an id greater than last_event_id"""
+        return ProjectEvent.query.filter(
+            ProjectEvent.owner_ulid == owner_ulid,
+            ProjectEvent.id > last_event_id
+        ).order_by(ProjectEvent.id).limit(limit).all()
+    
+    @staticmethod
+    def cleanup_old_events(retention_hours):
+        """Remove events older than the change feed retention window"""
+        removed = ProjectEvent.query.filter(
+            ProjectEvent.created_at < datetime.utcnow() - timedelta(hours=retention_hours)
+        ).delete(synchronize_session=False)
+        
+        db.session.commit()
+        return removed
+
+@db.event.listens_for(Project, 'after_insert')
+def record_project_created(mapper, connection, project):
+    ProjectEvent.record(connection, project, 'created')
+
+@db.event.listens_for(Project, 'after_update')
+def record_project_updated(mapper, connection, project):
+    ProjectEvent.record(connection, project, 'updated')
+
+@db.event.listens_for(Project, 'after_delete')
+def release_project_storage(mapper, connection, project):
+    """Release the deleted project's blob reference and storage usage, and log the deletion"""
+    if project.content_hash:
+        ProjectBlob.increment_ref_count(project.content_hash, -1, connection=connection)
+    
+    connection.execute(
+        db.update(User).where(
+            User.user_ulid == project.owner_ulid
+        ).values(
+            storage_used_bytes=User.storage_used_bytes - (project.data_size or 0),
+            projects_version=User.projects_version + 1,
+            updated_at=User.updated_at  # counters are not profile changes
+        )
+    )
+    ProjectEvent.record(connection, project, 'deleted')
+
+class ScheduledJob(db.Model):
+    """Last run of each periodic job, shared by all workers"""
+    __tablename__ = 'scheduled_jobs'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    last_run_at = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<ScheduledJob {self.name}>'
+    
+    @staticmethod
+    def claim(name, interval_seconds):
+        """Atomically take the next run of a job, returning whether this caller won it
+        
+        Only one caller per interval gets True, however many workers and hosts
+        ask at the same time.
+        """
+        now = datetime.utcnow()
+        claimed = db.session.execute(
+            db.update(ScheduledJob).where(
+                ScheduledJob.name == name,
+                ScheduledJob.last_run_at <= now - timedelta(seconds=interval_seconds)
+            ).values(last_run_at=now)
+        ).rowcount > 0
+        
+        if not claimed and db.session.get(ScheduledJob, name) is None:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(ScheduledJob(name=name, last_run_at=now))
+                claimed = True
+            except IntegrityError:
+                # Another worker claimed the first run concurrently
+                claimed = False
+        
+        db.session.commit()
+        return claimed
+
 class TokenBlocklist(db.Model):
     __tablename__ = 'token_blocklist'
     
@@ -84,16 +436,16 @@ class TokenBlocklist(db.Model):
         return token is not None
     
     @staticmethod
-    def add_token_to_blocklist(jti, token_type, user_id, expires_at):
-        """Add a token to the blocklist"""
-        blocklist_token = TokenBlocklist(
-            jti=jti,
-            token_type=token_type,
-            user_id=user_id,
-            expires_at=expires_at
+    def add_tokens_to_blocklist(rows):
+        """Add tokens to the blocklist in one multi-row INSERT; the caller commits
+
+        Tokens that are already blocklisted are skipped instead of failing the batch.
+        """
+        db.session.execute(
+            db.insert(TokenBlocklist).values(rows)
+                .prefix_with('IGNORE', dialect='mysql')
+                .prefix_with('OR IGNORE', dialect='sqlite')
         )
-        db.session.add(blocklist_token)
-        db.session.commit()
     
     @staticmethod
     def cleanup_expired_tokens():
@@ -108,6 +460,62 @@ class TokenBlocklist(db.Model):
         db.session.commit()
         return len(expired_tokens)
 
+class RefreshToken(db.Model):
+    """Issued refresh tokens, rotated on every use
+
+    Tokens issued from the same login share a family_id. Presenting a token
+    that was already rotated indicates theft and revokes the whole family.
+    """
+    __tablename__ = 'refresh_tokens'
+    
+    jti = db.Column(db.String(36), primary_key=True)  # JWT ID
+    user_ulid = db.Column(db.String(26), db.ForeignKey('users.user_ulid'), nullable=False, index=True)
+    family_id = db.Column(db.String(36), nullable=False, index=True)
+    issued_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    used_at = db.Column(db.DateTime, nullable=True)
+    revoked_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<RefreshToken {self.jti}>'
+    
+    @staticmethod
+    def consume(jti):
+        """Atomically mark a refresh token as used, returning False if it cannot be used"""
+        result = db.session.execute(
+            db.update(RefreshToken).where(
+                RefreshToken.jti == jti,
+                RefreshToken.used_at.is_(None),
+                RefreshToken.revoked_at.is_(None)
+            ).values(used_at=datetime.utcnow())
+        )
+        return result.rowcount > 0
+    
+    @staticmethod
+    def revoke_family(family_id):
+        """Revoke every refresh token descending from the same login"""
+        RefreshToken.revoke_families([family_id])
+    
+    @staticmethod
+    def revoke_families(family_ids):
+        """Revoke the refresh tokens of several logins in one UPDATE"""
+        db.session.execute(
+            db.update(RefreshToken).where(
+                RefreshToken.family_id.in_(family_ids),
+                RefreshToken.revoked_at.is_(None)
+            ).values(revoked_at=datetime.utcnow())
+        )
+    
+    @staticmethod
+    def cleanup_expired_tokens():
+        """Remove expired refresh tokens"""
+        removed = RefreshToken.query.filter(
+            RefreshToken.expires_at < datetime.utcnow()
+        ).delete(synchronize_session=False)
+        
+        db.session.commit()
+        return removed
+
 class PasswordResetOTP(db.Model):
     __tablename__ = 'password_reset_otps'
     
@@ -119,6 +527,10 @@ class PasswordResetOTP(db.Model):
     used_at = db.Column(db.DateTime, nullable=True)
     is_used = db.Column(db.Boolean, default=False)
     
+    __table_args__ = (
+        db.Index('ix_password_reset_otps_user_valid', 'user_ulid', 'is_used', 'expires_at'),
+    )
+    
     def __init__(self, user_ulid, expiry_minutes=15):
         self.user_ulid = user_ulid
         self.otp_code = self.generate_otp()
@@ -129,23 +541,18 @@ class PasswordResetOTP(db.Model):
         """Generate a 6-digit OTP"""
         return ''.join(secrets.choice(string.digits) for _ in range(6))
     
-    def is_valid(self):
-        """Check if OTP is still valid (not expired and not used)"""
-        return not self.is_used and datetime.utcnow() < self.expires_at
-    
-    def mark_as_used(self):
-        """Mark OTP as used"""
-        self.is_used = True
-        self.used_at = datetime.utcnow()
-    
     @staticmethod
-    def get_latest_valid_otp(user_ulid):
-        """Get the latest valid OTP for a user"""
-        return PasswordResetOTP.query.filter_by(
-            user_ulid=user_ulid,
-            is_used=False
+    def get_user_with_latest_valid_otp(email):
+        """Get a user and their latest valid OTP (or None) in a single query"""
+        return db.session.query(User, PasswordResetOTP).outerjoin(
+            PasswordResetOTP,
+            db.and_(
+                PasswordResetOTP.user_ulid == User.user_ulid,
+                PasswordResetOTP.is_used == False,
+                PasswordResetOTP.expires_at > datetime.utcnow()
+            )
         ).filter(
-            PasswordResetOTP.expires_at > datetime.utcnow()
+            User.email == email
         ).order_by(
             PasswordResetOTP.created_at.desc()
         ).first()
@@ -153,13 +560,23 @@ class PasswordResetOTP(db.Model):
     @staticmethod
     def invalidate_all_user_otps(user_ulid):
         """Mark all existing OTPs for a user as used"""
-        otps = PasswordResetOTP.query.filter_by(
-            user_ulid=user_ulid,
-            is_used=False
-        ).all()
-        
-        for otp in otps:
-            otp.mark_as_used()
+        db.session.execute(
+            db.update(PasswordResetOTP).where(
+                PasswordResetOTP.user_ulid == user_ulid,
+                PasswordResetOTP.is_used == False
+            ).values(is_used=True, used_at=datetime.utcnow())
+        )
+    
+    @staticmethod
+    def consume(otp_id):
+        """Atomically mark an OTP as used, returning False if it was already used"""
+        result = db.session.execute(
+            db.update(PasswordResetOTP).where(
+                PasswordResetOTP.id == otp_id,
+                PasswordResetOTP.is_used == False
+            ).values(is_used=True, used_at=datetime.utcnow())
+        )
+        return result.rowcount > 0
     
     @staticmethod
     def cleanup_expired_otps():
@@ -0,0 +1,139 @@
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+from app.common.db import db
+from app.common.metrics import metrics
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+def pool_sizing(worker_class, threads, worker_connections, background_threads=3):
+    """Size a worker's connection pool for its Gunicorn worker class
+
+    Returns (pool_size, max_overflow). Threaded workers get one connection
+    per request thread, plus overflow for the background threads (cleanup,
+    event polling, revocation writer). Async workers can run far more
+    requests than the database should see connections, so their pool is
+    capped and greenlets queue for a connection instead.
+    """
+    if worker_class in ('gevent', 'eventlet'):
+        return min(worker_connections, 10), 10
+    if worker_class == 'sync':
+        return 1, background_threads
+    return max(1, threads), background_threads
+
+def engine_options(database_uri, pool_size, max_overflow, pool_timeout, pool_recycle=300):
+    """Engine options for an instrumented queue pool without checkout pings
+
+    pool_recycle retires connections before MySQL's wait_timeout. A connection
+    that drops anyway fails once and gets the pool refreshed (optimistic
+    disconnect handling) instead of every checkout paying a ping round trip.
+    """
+    if database_uri.startswith('sqlite') and database_uri.split('?')[0] in ('sqlite://', 'sqlite:///:memory:'):
+        return {}  # In-memory SQLite needs its single shared connection
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+        'pool_recycle': pool_recycle,
+        'pool_pre_ping': False
+    }
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits for a connection"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            metrics.incr('db.pool.timeouts')
+            raise
+        finally:
+            metrics.observe('db.pool.checkout_wait', time.perf_counter() - started)
+
+def pool_status(pool):
+    if not isinstance(pool, QueuePool):
+        return {'status': pool.status()}
+    return {
+        'size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        'overflow': max(0, pool.overflow())
+    }
+
+def init_pool_telemetry(app):
+    """Count database errors and pool invalidations and expose pool gauges"""
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'handle_error')
+    def count_database_error(context):
+        metrics.incr('db.errors')
+        if context.is_disconnect:
+            # Without pre-ping, a dropped connection surfaces here once and the pool is refreshed
+            metrics.incr('db.disconnects')
+
+    @event.listens_for(engine, 'invalidate')
+    def count_invalidation(dbapi_connection, connection_record, exception):
+        metrics.incr('db.pool.invalidated')
+
+    metrics.register_gauge('db.pool', lambda: pool_status(engine.pool))
+    return engine
+
+class DatabaseProbe:
+    """Readiness probe running SELECT 1 at most once per interval
+
+    Callers get the cached result while it is fresh. When it goes stale, one
+    caller refreshes it and the others keep returning the previous result,
+    so health checks never pile up on the database.
+    """
+
+    def __init__(self, app, interval=5.0):
+        self.app = app
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._result = None
+        self._checked_at = 0.0
+
+    def check(self):
+        if time.monotonic() - self._checked_at >= self.interval:
+            # Only the first check ever has to wait for a result
+            if self._lock.acquire(blocking=self._result is None):
+                try:
+                    if time.monotonic() - self._checked_at >= self.interval:
+                        self._result = self._probe()
+                        self._checked_at = time.monotonic()
+                finally:
+                    self._lock.release()
+
+        result = dict(self._result)
+        result['age_seconds'] = round(time.monotonic() - self._checked_at, 3)
+        return result
+
+    def _probe(self):
+        started = time.perf_counter()
+        try:
+            with self.app.app_context():
+                try:
+                    self._select_one()
+                except exc.DBAPIError as e:
+                    if not e.connection_invalidated:
+                        raise
+                    # The pool has been refreshed after a dropped connection; try once more
+                    self._select_one()
+        except Exception as e:
+            metrics.incr('db.probe.failures')
+            logger.warning("Database readiness probe failed: %s", e)
+            return {'ok': False, 'error': type(e).__name__}
+
+        latency = time.perf_counter() - started
+        metrics.observe('db.probe', latency)
+        return {'ok': True, 'latency_ms': round(latency * 1000, 3)}
+
+    @staticmethod
+    def _select_one():
+        with db.engine.connect() as connection:
+            connection.execute(db.text('SELECT 1'))
@@ -0,0 +1,213 @@
+from functools import wraps
+from flask import current_app, request, jsonify
+from app.common.metrics import metrics
+import fcntl
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # Optional dependency, only needed for the external backend
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+def sliding_window_decision(previous, current, window, elapsed, limit):
+    """Decide a hit with the sliding window counter approximation
+
+    The previous fixed window's count is weighted by how much of it still
+    overlaps the sliding window. Returns (allowed, retry_after_seconds).
+    """
+    weight = (window - elapsed) / window
+    if previous * weight + current + 1 <= limit:
+        return True, 0
+
+    if current + 1 > limit:
+        # Wait for the next fixed window, where this one's count still weighs in
+        decay = max(0.0, window - (limit - 1) * window / current)
+        return False, max(1, math.ceil(window - elapsed + decay))
+
+    # Wait until the previous window's weight has decayed enough
+    needed_elapsed = window - (limit - current - 1) * window / previous
+    return False, max(1, math.ceil(needed_elapsed - elapsed))
+
+class SharedMemoryBackend:
+    """Sliding window counters in an mmap'd file shared by all workers on a host
+
+    The file holds a fixed table of slots addressed by a 64-bit key hash with
+    short linear probing. When all probed slots are taken, the one with the
+    oldest window is reused, so memory stays bounded under key floods.
+    """
+
+    SLOT = struct.Struct('<QdII')  # key hash, window start, previous count, current count
+    PROBES = 8
+
+    def __init__(self, path, slots=8192):
+        self.path = path
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file = None
+        self._map = None
+
+    def _open(self):
+        # Each worker process needs its own file descriptor for flock to exclude the others
+        if self._pid == os.getpid():
+            return
+        size = self.slots * self.SLOT.size
+        self._file = open(self.path, 'a+b')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._file.fileno()).st_size < size:
+                self._file.truncate(size)
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._pid = os.getpid()
+
+    @staticmethod
+    def key_hash(key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little') | 1  # 0 marks an empty slot
+
+    def hit(self, key, limit, window):
+        key_hash = self.key_hash(key)
+        now = time.time()
+        window_start = now - now % window
+
+        with self._lock:
+            self._open()
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                offset = self._find_slot(key_hash)
+                stored_hash, stored_start, previous, current = self.SLOT.unpack_from(self._map, offset)
+
+                if stored_hash != key_hash or stored_start < window_start - window:
+                    previous, current = 0, 0
+                elif stored_start < window_start:
+                    previous, current = current, 0
+
+                allowed, retry_after = sliding_window_decision(previous, current, window, now - window_start, limit)
+                if allowed:
+                    current += 1
+                self.SLOT.pack_into(self._map, offset, key_hash, window_start, previous, current)
+                return allowed, retry_after
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def _find_slot(self, key_hash):
+        start = key_hash % self.slots
+        victim_offset, victim_start = None, None
+        for probe in range(self.PROBES):
+            offset = ((start + probe) % self.slots) * self.SLOT.size
+            stored_hash, stored_start, _, _ = self.SLOT.unpack_from(self._map, offset)
+            if stored_hash == key_hash or stored_hash == 0:
+                return offset
+            if victim_start is None or stored_start < victim_start:
+                victim_offset, victim_start = offset, stored_start
+        return victim_offset
+
+class RedisBackend:
+    """Sliding window counters in Redis, for limits shared across hosts"""
+
+    def __init__(self, client, prefix='ratelimit'):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url):
+        if redis is None:
+            raise RuntimeError('redis package is required for the external rate limit backend')
+        return cls(redis.Redis.from_url(url))
+
+    def hit(self, key, limit, window):
+        now = time.time()
+        window_index = int(now // window)
+        current_key = f'{self.prefix}:{key}:{window_index}'
+        previous_key = f'{self.prefix}:{key}:{window_index - 1}'
+
+        previous, current = self.client.mget(previous_key, current_key)
+        previous, current = int(previous or 0), int(current or 0)
+
+        allowed, retry_after = sliding_window_decision(previous, current, window, now % window, limit)
+        if allowed:
+            pipeline = self.client.pipeline()
+            pipeline.incr(current_key)
+            pipeline.expire(current_key, window * 2)
+            pipeline.execute()
+        return allowed, retry_after
+
+class RateLimiter:
+    def __init__(self, backend, rules):
+        self.backend = backend
+        self.rules = rules
+
+    def check(self, rule_name, ip, account=None):
+        """Apply a rule's per-IP and per-account limits, returning (allowed, retry_after)"""
+        rule = self.rules.get(rule_name, {})
+        checks = [('ip', ip)]
+        if account:
+            checks.append(('account', account))
+
+        for scope, value in checks:
+            if scope not in rule:
+                continue
+            limit, window = rule[scope]
+            try:
+                allowed, retry_after = self.backend.hit(f'{rule_name}:{scope}:{value}', limit, window)
+            except Exception as e:
+                # Fail open: throttling must never take the endpoint down
+                logger.error("Rate limit backend error: %s", e)
+                metrics.incr('rate_limit.errors')
+                return True, 0
+            if not allowed:
+                metrics.incr(f'rate_limit.rejected.{rule_name}.{scope}')
+                return False, retry_after
+        return True, 0
+
+def default_shm_path():
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, 'netcraft-ratelimit')
+
+def init_rate_limiter(app):
+    """Create the app's rate limiter from configuration"""
+    redis_url = app.config.get('RATE_LIMIT_REDIS_URL')
+    if redis_url:
+        backend = RedisBackend.from_url(redis_url)
+    else:
+        backend = SharedMemoryBackend(app.config.get('RATE_LIMIT_SHM_PATH') or default_shm_path())
+
+    limiter = RateLimiter(backend, app.config['RATE_LIMITS'])
+    app.extensions['rate_limiter'] = limiter
+    return limiter
+
+def rate_limited(rule_name, account_field=None):
+    """Throttle a route per client IP and, optionally, per account named in the JSON body"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not current_app.config['RATE_LIMIT_ENABLED']:
+                return view(*args, **kwargs)
+
+            account = None
+            if account_field:
+                data = request.get_json(silent=True)
+                if isinstance(data, dict) and isinstance(data.get(account_field), str):
+                    account = data[account_field].strip().lower()
+
+            limiter = current_app.extensions['rate_limiter']
+            allowed, retry_after = limiter.check(rule_name, request.remote_addr, account)
+            if not allowed:
+                response = jsonify({'error': 'Too many requests. Please try again later.'})
+                response.headers['Retry-After'] = str(retry_after)
+                return response, 429
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
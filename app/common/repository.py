@@ -0,0 +1,60 @@
+from sqlalchemy import select, bindparam
+from app.common.db import db
+from app.common.models import User, Project, TokenBlocklist
+
+class UserRow:
+    """Read-only user profile columns"""
+
+    __slots__ = ('user_ulid', 'nickname', 'email', 'first_name', 'last_name',
+                 'created_at', 'updated_at', 'storage_used_bytes')
+
+    def __init__(self, row):
+        for name in self.__slots__:
+            setattr(self, name, getattr(row, name))
+
+class ProjectRow:
+    """Read-only project columns, without the data blob"""
+
+    __slots__ = ('project_ulid', 'name', 'owner_ulid', 'created_at', 'updated_at',
+                 'data_size', 'element_count', 'element_counts', 'content_hash')
+
+    def __init__(self, row):
+        for name in self.__slots__:
+            setattr(self, name, getattr(row, name))
+
+    # Same representation as the ORM model
+    etag = Project.etag
+    summary_dict = Project.summary_dict
+
+    def to_dict(self):
+        return Project.to_dict(self, include_data=False)
+
+# Core (non-ORM) statements for the hottest per-request lookups. They are built
+# once at import so SQLAlchemy's compiled cache is hit without rebuilding the
+# query, and run on the session's connection (sharing its transaction) while
+# skipping ORM entity loading and the identity map.
+_jti_blocklisted = select(TokenBlocklist.id).where(
+    TokenBlocklist.jti == bindparam('jti')
+).limit(1)
+
+_user_by_ulid = select(*(getattr(User, name) for name in UserRow.__slots__)).where(
+    User.user_ulid == bindparam('user_ulid')
+)
+
+_project_by_ulid = select(*(getattr(Project, name) for name in ProjectRow.__slots__)).where(
+    Project.project_ulid == bindparam('project_ulid')
+)
+
+def is_jti_blocklisted(jti):
+    """Check if a JWT ID is in the blocklist"""
+    return db.session.connection().execute(_jti_blocklisted, {'jti': jti}).first() is not None
+
+def get_user(user_ulid):
+    """Get a user's profile columns as a UserRow, or None"""
+    row = db.session.connection().execute(_user_by_ulid, {'user_ulid': user_ulid}).first()
+    return UserRow(row) if row is not None else None
+
+def get_project(project_ulid):
+    """Get a project's columns (without data) as a ProjectRow, or None"""
+    row = db.session.connection().execute(_project_by_ulid, {'project_ulid': project_ulid}).first()
+    return ProjectRow(row) if row is not None else None
@@ -0,0 +1,55 @@
+from app.common.metrics import metrics
+import threading
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key within a worker into one execution
+
+    The first caller for a key runs the function; callers arriving while it
+    runs wait for and share its result (or exception). Nothing is cached once
+    the call completes, so results are never older than the call they joined.
+    """
+
+    def __init__(self, name, wait_timeout=30.0):
+        self.name = name
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+
+        metrics.register_gauge(f'singleflight.{name}.in_flight', lambda: len(self._calls))
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            # If the leader is stuck, do the work ourselves rather than wait forever
+            if not call.done.wait(self.wait_timeout):
+                metrics.incr(f'singleflight.{self.name}.wait_timeouts')
+                return func()
+            metrics.incr(f'singleflight.{self.name}.shared')
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        metrics.incr(f'singleflight.{self.name}.executed')
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
@@ -1,6 +1,7 @@
 import os
 from datetime import timedelta
 from dotenv import load_dotenv
+from app.common.pool import pool_sizing, engine_options
 
 # Load .env file only if it exists (for local development)
 if os.path.exists('.env'):
@@ -16,13 +17,121 @@ class Config:
     DB_USER = os.environ.get('DB_USER')
     DB_PASSWORD = os.environ.get('DB_PASSWORD') 
     
-    # Construct DATABASE_URL
-    SQLALCHEMY_DATABASE_URI = f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+    # Use DATABASE_URL if given (e.g. SQLite for tests), otherwise construct it
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
+        f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_recycle': 300,
-        'pool_pre_ping': True
+    
+    # Gunicorn worker model (see Dockerfile); sizes the connection pool and admission limits
+    GUNICORN_WORKER_CLASS = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+    GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', 8))
+    GUNICORN_WORKER_CONNECTIONS = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+    
+    # Connection pool per worker process, sized for the worker model unless overridden
+    _pool_size, _max_overflow = pool_sizing(GUNICORN_WORKER_CLASS, GUNICORN_THREADS, GUNICORN_WORKER_CONNECTIONS)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', _pool_size))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', _max_overflow))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT)
+    
+    # /health runs SELECT 1 at most this often and serves the cached result in between
+    HEALTH_PROBE_INTERVAL_SECONDS = float(os.environ.get('HEALTH_PROBE_INTERVAL_SECONDS', 5))
+    
+    # Per-IP and per-account sliding window limits as (requests, window seconds).
+    # Counters live in shared memory on the host, or in Redis if RATE_LIMIT_REDIS_URL is set.
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_SHM_PATH = os.environ.get('RATE_LIMIT_SHM_PATH')
+    RATE_LIMIT_REDIS_URL = os.environ.get('RATE_LIMIT_REDIS_URL')
+    RATE_LIMITS = {
+        'login': {'ip': (20, 60), 'account': (5, 60)},
+        'forgot_password': {'ip': (5, 300), 'account': (3, 900)},
+        'verify_reset_otp': {'ip': (10, 300), 'account': (5, 900)},
+        'reset_password': {'ip': (10, 300), 'account': (5, 900)}
     }
+    # Number of reverse proxies in front of the app. Per-IP limits use the client
+    # address from X-Forwarded-For (and the scheme from X-Forwarded-Proto) as set by
+    # that many proxies; with 0 every client behind a proxy would share its IP.
+    # Never set it higher than the real number of proxies, or clients can spoof their IP.
+    TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+    
+    # Logging: records are written by a background thread; when its queue is
+    # full they are dropped (counted in /metrics) rather than blocking requests
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')  # 'json' or 'text'
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    ACCESS_LOG_SAMPLE_RATE = float(os.environ.get('ACCESS_LOG_SAMPLE_RATE', 0.1))  # failed requests are always logged
+    
+    # Response compression (brotli is used when the optional package is installed)
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+    COMPRESSION_GZIP_LEVEL = 6
+    COMPRESSION_BROTLI_QUALITY = 5
+    COMPRESSION_CACHE_SIZE = int(os.environ.get('COMPRESSION_CACHE_SIZE', 256))  # compressed bodies kept per ETag
+    MAX_DECOMPRESSED_REQUEST_BYTES = 2 * 1024 * 1024
+    
+    # Hourly cleanup runs in whichever worker claims it first; the others only check
+    CLEANUP_INTERVAL_SECONDS = int(os.environ.get('CLEANUP_INTERVAL_SECONDS', 3600))
+    CLEANUP_CHECK_SECONDS = int(os.environ.get('CLEANUP_CHECK_SECONDS', 300))
+    
+    # Project change feed (server-sent events)
+    EVENTS_POLL_INTERVAL_SECONDS = float(os.environ.get('EVENTS_POLL_INTERVAL_SECONDS', 1.0))
+    EVENTS_HEARTBEAT_SECONDS = 15
+    EVENTS_MAX_STREAM_SECONDS = int(os.environ.get('EVENTS_MAX_STREAM_SECONDS', 300))  # clients reconnect with Last-Event-ID
+    EVENTS_RETENTION_HOURS = int(os.environ.get('EVENTS_RETENTION_HOURS', 24))
+    EVENTS_MAX_REPLAY = int(os.environ.get('EVENTS_MAX_REPLAY', 5000))  # larger backlogs get a reset event
+    # An open stream holds a whole thread in threaded workers but only a greenlet in
+    # async ones, so streams are meant to be served by gevent workers (the events
+    # service in docker-compose.yaml); threaded workers keep just a couple for fallback
+    _async_workers = GUNICORN_WORKER_CLASS in ('gevent', 'eventlet')
+    EVENTS_MAX_STREAMS_PER_WORKER = int(os.environ.get(
+        'EVENTS_MAX_STREAMS_PER_WORKER', GUNICORN_WORKER_CONNECTIONS * 9 // 10 if _async_workers else 2
+    ))
+    
+    # Admission control: per route class in-flight limits per worker, shrinking
+    # while latency is above target. One thread (or connection) is always kept for exempt endpoints.
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() == 'true'
+    ADMISSION_TOTAL_LIMIT = max(1, (GUNICORN_WORKER_CONNECTIONS if _async_workers else GUNICORN_THREADS)
+                                - EVENTS_MAX_STREAMS_PER_WORKER - 1)
+    ADMISSION_CLASS_LIMITS = {
+        'auth': 2,  # password hashing is CPU bound
+        'project_read': 4,
+        'project_write': 3,
+        'default': 4
+    }
+    ADMISSION_TARGET_LATENCY_SECONDS = {
+        'auth': 1.0,
+        'project_read': 0.5,
+        'project_write': 1.0,
+        'default': 0.5
+    }
+    
+    # Per-user total size of project data
+    USER_STORAGE_QUOTA_BYTES = int(os.environ.get('USER_STORAGE_QUOTA_BYTES', 50 * 1024 * 1024))
+    
+    # Response caching; CACHE_REDIS_URL adds a shared backend behind the in-process LRU
+    PROJECT_LIST_CACHE_SIZE = int(os.environ.get('PROJECT_LIST_CACHE_SIZE', 1024))
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+    CACHE_SHARED_TTL_SECONDS = int(os.environ.get('CACHE_SHARED_TTL_SECONDS', 3600))
+    
+    # Cold storage for project data that has not been accessed recently
+    COLD_STORAGE_BACKEND = os.environ.get('COLD_STORAGE_BACKEND', 'local')  # 'local' or 's3'
+    COLD_STORAGE_PATH = os.environ.get('COLD_STORAGE_PATH', os.path.join(os.getcwd(), 'cold_storage'))
+    COLD_STORAGE_S3_BUCKET = os.environ.get('COLD_STORAGE_S3_BUCKET')
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 30))
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 100))
+    BLOB_ACCESS_TOUCH_SECONDS = 3600  # Granularity of last-access tracking
+    
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY')
-    JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)  # Tokens expire after 24 hours
\ No newline at end of file
+    # Short-lived access tokens keep the blocklist small; refresh tokens are rotated on use
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=int(os.environ.get('JWT_ACCESS_TOKEN_MINUTES', 15)))
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=int(os.environ.get('JWT_REFRESH_TOKEN_DAYS', 30)))
+    JWT_QUERY_STRING_NAME = 'jwt'  # only GET /api/projects/events also reads the token from the query string
+    
+    # Per-user token versions (bumped to revoke all of a user's tokens) are cached per worker
+    TOKEN_VERSION_CACHE_SIZE = 10000
+    TOKEN_VERSION_CACHE_SECONDS = int(os.environ.get('TOKEN_VERSION_CACHE_SECONDS', 30))
+    
+    # Logouts are blocklisted in group commits: revocations arriving within the
+    # delay share one transaction. Revoked JTIs are also remembered per worker.
+    REVOCATION_FLUSH_DELAY_SECONDS = float(os.environ.get('REVOCATION_FLUSH_DELAY_SECONDS', 0.005))
+    REVOCATION_CACHE_SIZE = 10000
\ No newline at end of file
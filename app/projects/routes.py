@@ -1,14 +1,24 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.common.db import db
-from app.common.models import Project
+from datetime import datetime
+from app.common.models import Project, ProjectBlob, ProjectEvent, User
+from app.common.cold_storage import load_blob_data
+from app.common.events import load_backlog, stream_events
+from app.common.singleflight import SingleFlight
+from app.common import repository
+import hashlib
 import html
-import json
 import logging
+import re
 
 projects_bp = Blueprint('projects', __name__)
 logger = logging.getLogger(__name__)
 
+# Coalesce concurrent identical project reads within a worker
+project_row_flights = SingleFlight('project_row')
+project_body_flights = SingleFlight('project_body')
+
 def sanitize_project_input(data):
     """Sanitize project input data"""
     if isinstance(data, dict):
@@ -28,29 +38,274 @@ def sanitize_project_input(data):
         return sanitized
     return data
 
+# Sortable columns for project list views; all are covered by an (owner_ulid, ...) index
+# or cheap enough to sort within a single user's projects
+PROJECT_SORT_COLUMNS = {
+    'created_at': Project.created_at,
+    'updated_at': Project.updated_at,
+    'name': Project.name,
+    'data_size': Project.data_size,
+    'element_count': Project.element_count
+}
+
+SEARCH_DEFAULT_LIMIT = 50
+SEARCH_MAX_LIMIT = 200
+
+def parse_int_arg(name):
+    """Parse an optional non-negative integer query parameter"""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    if not value.isdigit():
+        raise ValueError(f'{name} must be a non-negative integer')
+    return int(value)
+
+def apply_summary_filters(query):
+    """Apply size/element-count filters from the query string to a Project query"""
+    min_size = parse_int_arg('min_size')
+    max_size = parse_int_arg('max_size')
+    min_elements = parse_int_arg('min_elements')
+    max_elements = parse_int_arg('max_elements')
+    
+    if min_size is not None:
+        query = query.filter(Project.data_size >= min_size)
+    if max_size is not None:
+        query = query.filter(Project.data_size <= max_size)
+    if min_elements is not None:
+        query = query.filter(Project.element_count >= min_elements)
+    if max_elements is not None:
+        query = query.filter(Project.element_count <= max_elements)
+    return query
+
+def apply_sort(query):
+    """Apply ?sort= and ?order= to a Project query (newest first by default)"""
+    sort = request.args.get('sort', 'created_at')
+    order = request.args.get('order', 'desc').lower()
+    
+    if sort not in PROJECT_SORT_COLUMNS:
+        raise ValueError(f"sort must be one of: {', '.join(PROJECT_SORT_COLUMNS)}")
+    if order not in ('asc', 'desc'):
+        raise ValueError('order must be asc or desc')
+    
+    column = PROJECT_SORT_COLUMNS[sort]
+    return query.order_by(column.asc() if order == 'asc' else column.desc())
+
 @projects_bp.route('/my-projects', methods=['GET'])
 @jwt_required()
 def get_my_projects():
     try:
         current_user_id = get_jwt_identity()
         
-        # Query all projects for the current user, ordered by creation date (newest first)
-        projects = Project.query.filter_by(owner_ulid=current_user_id)\
-                                .order_by(Project.created_at.desc())\
-                                .all()
+        # Serve the cached list unless a project write has bumped the user's version
+        version = User.get_projects_version(current_user_id)
+        query_string = '&'.join(f'{key}={value}' for key, value in sorted(request.args.items(multi=True)))
+        cache_key = f'{current_user_id}:{version}:{query_string}'
+        etag = hashlib.sha1(cache_key.encode('utf-8')).hexdigest()
+        
+        if version is not None and request.if_none_match.contains_weak(etag):
+            return current_app.response_class(status=304, headers={'ETag': f'W/"{etag}"'})
+        
+        cache = current_app.extensions['project_list_cache']
+        body = cache.get(cache_key) if version is not None else None
+        if body is not None:
+            response = current_app.response_class(body, mimetype='application/json')
+            response.set_etag(etag, weak=True)
+            response.headers['X-Cache'] = 'HIT'
+            return response, 200
+        
+        # Query the current user's projects without touching the data blobs;
+        # the precomputed summary columns cover list views, sorting and filtering
+        query = Project.query.filter_by(owner_ulid=current_user_id)
+        try:
+            query = apply_sort(apply_summary_filters(query))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        projects = query.all()
         
         # Convert projects to dict format without the data column
         projects_data = [project.to_dict(include_data=False) for project in projects]
         
-        return jsonify({
+        body = current_app.json.dumps({
             'projects': projects_data,
             'count': len(projects_data)
-        }), 200
+        }).encode('utf-8')
+        if version is not None:
+            cache.set(cache_key, body)
+        
+        response = current_app.response_class(body, mimetype='application/json')
+        if version is not None:
+            response.set_etag(etag, weak=True)
+        response.headers['X-Cache'] = 'MISS'
+        return response, 200
         
     except Exception as e:
-        logger.error(f"Failed to retrieve projects for user {current_user_id}: {str(e)}")
+        logger.error("Failed to retrieve projects for user %s: %s", current_user_id, e)
         return jsonify({'error': 'Failed to retrieve projects'}), 400
 
+def parse_datetime_arg(name):
+    """Parse an optional ISO 8601 date/datetime query parameter"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an ISO 8601 date or datetime')
+
+def escape_like(value):
+    """Escape LIKE wildcards so user input matches literally"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def fulltext_terms(query_text):
+    """Split a search string into plain word terms for a full-text MATCH"""
+    return re.findall(r'\w+', query_text)
+
+def apply_name_match(query, query_text, match):
+    """Filter a Project query by name using a prefix or full-text match"""
+    if match == 'prefix':
+        return query.filter(Project.name.like(escape_like(query_text) + '%', escape='\\'))
+    
+    terms = fulltext_terms(query_text)
+    if not terms:
+        return query.filter(db.false())
+    
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        # Every term must match, each as a word prefix
+        boolean_query = ' '.join(f'+{term}*' for term in terms)
+        return query.filter(
+            db.text('MATCH (projects.name) AGAINST (:fulltext_query IN BOOLEAN MODE)')
+              .bindparams(fulltext_query=boolean_query)
+        )
+    if dialect == 'sqlite':
+        fts_query = ' '.join(f'"{term}"*' for term in terms)
+        return query.filter(Project.project_ulid.in_(
+            db.text('SELECT project_ulid FROM projects_fts WHERE projects_fts MATCH :fulltext_query')
+              .bindparams(fulltext_query=fts_query)
+              .columns(project_ulid=db.String)
+        ))
+    
+    # No full-text support on this backend, fall back to substring matching
+    for term in terms:
+        query = query.filter(Project.name.like('%' + escape_like(term) + '%', escape='\\'))
+    return query
+
+@projects_bp.route('/search', methods=['GET'])
+@jwt_required()
+def search_projects():
+    try:
+        current_user_id = get_jwt_identity()
+        
+        query_text = html.escape(request.args.get('q', '').strip())
+        match = request.args.get('match', 'prefix')
+        if match not in ('prefix', 'fulltext'):
+            return jsonify({'error': 'match must be prefix or fulltext'}), 400
+        
+        try:
+            limit = parse_int_arg('limit')
+            offset = parse_int_arg('offset') or 0
+            created_after = parse_datetime_arg('created_after')
+            created_before = parse_datetime_arg('created_before')
+            updated_after = parse_datetime_arg('updated_after')
+            updated_before = parse_datetime_arg('updated_before')
+            
+            query = Project.query.filter_by(owner_ulid=current_user_id)
+            if query_text:
+                query = apply_name_match(query, query_text, match)
+            if created_after:
+                query = query.filter(Project.created_at >= created_after)
+            if created_before:
+                query = query.filter(Project.created_at < created_before)
+            if updated_after:
+                query = query.filter(Project.updated_at >= updated_after)
+            if updated_before:
+                query = query.filter(Project.updated_at < updated_before)
+            query = apply_sort(apply_summary_filters(query))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        limit = min(limit or SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT)
+        projects = query.offset(offset).limit(limit).all()
+        
+        projects_data = [project.to_dict(include_data=False) for project in projects]
+        
+        return jsonify({
+            'projects': projects_data,
+            'count': len(projects_data),
+            'limit': limit,
+            'offset': offset
+        }), 200
+        
+    except Exception as e:
+        logger.error("Failed to search projects for user %s: %s", current_user_id, e)
+        return jsonify({'error': 'Failed to search projects'}), 400
+
+@projects_bp.route('/events', methods=['GET'])
+# Browsers' EventSource cannot set headers, so this route also takes ?jwt=<access token>
+@jwt_required(locations=['headers', 'query_string'])
+def project_events():
+    try:
+        current_user_id = get_jwt_identity()
+        
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        if last_event_id is not None and not last_event_id.isdigit():
+            return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+        
+        # Streams are capped per worker: a few on threaded workers, many on async ones
+        broker = current_app.extensions['event_broker']
+        if broker.subscriber_count() >= current_app.config['EVENTS_MAX_STREAMS_PER_WORKER']:
+            response = jsonify({'error': 'Too many open event streams. Please try again later.'})
+            response.headers['Retry-After'] = '5'
+            return response, 503
+        
+        # New clients only get events from now on
+        latest_id = ProjectEvent.get_latest_id()
+        after_id = latest_id if last_event_id is None else int(last_event_id)
+        
+        # Subscribe before reading the backlog so no event falls in between: the
+        # backlog covers what was committed up to now, the broker everything after
+        # latest_id that it has not dispatched before this subscription
+        subscription = broker.subscribe(current_user_id, latest_id)
+        
+        try:
+            reset = False
+            backlog, complete = load_backlog(
+                current_user_id, after_id, current_app.config['EVENTS_MAX_REPLAY']
+            )
+            if not complete:
+                # Too far behind to replay; the client refetches its projects instead
+                backlog = []
+                after_id = latest_id
+                reset = True
+        except Exception:
+            broker.unsubscribe(current_user_id, subscription)
+            raise
+        
+        stream = stream_events(
+            broker,
+            current_user_id,
+            subscription,
+            after_id,
+            backlog,
+            heartbeat_seconds=current_app.config['EVENTS_HEARTBEAT_SECONDS'],
+            max_seconds=current_app.config['EVENTS_MAX_STREAM_SECONDS'],
+            reset=reset
+        )
+        response = Response(stream, mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+        # The stream never touches the database, so don't hold a pooled connection for it
+        db.session.close()
+        # Also covers clients that disconnect before the stream is iterated
+        response.call_on_close(lambda: broker.unsubscribe(current_user_id, subscription))
+        return response
+        
+    except Exception as e:
+        logger.error("Failed to open event stream for user %s: %s", current_user_id, e)
+        return jsonify({'error': 'Failed to open event stream'}), 400
+
 @projects_bp.route('/save', methods=['POST'])
 @jwt_required()
 def save_project():
@@ -70,19 +325,29 @@ def save_project():
         sanitized_name = html.escape(name)
         sanitized_data = sanitize_project_input(data.get('data', {}))
         
-        # Validate JSON data size to prevent DoS
+        # Serialize once to validate the data and compute its summary
         try:
-            json_str = json.dumps(sanitized_data)
-            if len(json_str) > 1048576:  # 1MB limit
-                return jsonify({'error': 'Project data too large (max 1MB)'}), 400
+            summary = Project.summarize_data(sanitized_data)
         except (TypeError, ValueError):
             return jsonify({'error': 'Invalid project data format'}), 400
         
+        # Validate JSON data size to prevent DoS
+        if summary['data_size'] > 1048576:  # 1MB limit
+            return jsonify({'error': 'Project data too large (max 1MB)'}), 400
+        
+        # Charge the user's storage quota in the same transaction as the insert
+        if not User.reserve_storage(current_user_id, summary['data_size'], current_app.config['USER_STORAGE_QUOTA_BYTES']):
+            db.session.rollback()
+            return jsonify({'error': 'Storage quota exceeded'}), 413
+        
+        # Store the data once per content hash and reference it from the project
+        ProjectBlob.acquire(summary['content_hash'], sanitized_data)
+        
         # Create new project
         project = Project(
             name=sanitized_name,
-            data=sanitized_data,
-            owner_ulid=current_user_id
+            owner_ulid=current_user_id,
+            **summary
         )
         
         db.session.add(project)
@@ -90,14 +355,36 @@ def save_project():
         
         return jsonify({
             'message': 'Project saved successfully',
-            'project_ulid': project.project_ulid
+            'project_ulid': project.project_ulid,
+            'summary': project.summary_dict()
         }), 201
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Failed to save project for user {current_user_id}: {str(e)}")
+        logger.error("Failed to save project for user %s: %s", current_user_id, e)
         return jsonify({'error': 'Failed to save project'}), 400
 
+def load_project_row(project_ulid):
+    """Load what every get_project caller needs before its ownership check"""
+    project = repository.get_project(project_ulid)
+    if not project:
+        return None
+    return {
+        'owner_ulid': project.owner_ulid,
+        'etag': project.etag(),
+        'content_hash': project.content_hash,
+        'fields': project.to_dict()
+    }
+
+def build_project_body(project):
+    """Load a project's data and serialize the full JSON response body"""
+    blob = ProjectBlob.query.get(project['content_hash']) if project['content_hash'] else None
+    
+    # Archived projects are transparently rehydrated from cold storage
+    project_data = dict(project['fields'])
+    project_data['data'] = load_blob_data(blob) if blob else None
+    return current_app.json.dumps(project_data).encode('utf-8')
+
 @projects_bp.route('/<project_ulid>', methods=['GET'])
 @jwt_required()
 def get_project(project_ulid):
@@ -108,18 +395,29 @@ def get_project(project_ulid):
         if not is_valid_ulid(project_ulid):
             return jsonify({'error': 'Invalid project identifier'}), 400
         
-        project = Project.query.get(project_ulid)
+        # Concurrent reads of the same project share one row fetch...
+        project = project_row_flights.do(project_ulid, lambda: load_project_row(project_ulid))
         if not project:
             return jsonify({'error': 'Project not found'}), 404
         
         # Check if user owns the project
-        if project.owner_ulid != current_user_id:
+        if project['owner_ulid'] != current_user_id:
             return jsonify({'error': 'Project not found'}), 404  # Don't reveal existence
         
-        return jsonify(project.to_dict()), 200
+        # Projects are immutable once saved, so the row identifies the representation
+        etag = project['etag']
+        if request.if_none_match.contains_weak(etag):
+            return current_app.response_class(status=304, headers={'ETag': f'W/"{etag}"'})
+        
+        # ...and one data load and serialization per project version
+        body = project_body_flights.do((project_ulid, etag), lambda: build_project_body(project))
+        
+        response = current_app.response_class(body, mimetype='application/json')
+        response.set_etag(etag, weak=True)
+        return response, 200
         
     except Exception as e:
-        logger.error(f"Failed to retrieve project {project_ulid} for user {current_user_id}: {str(e)}")
+        logger.error("Failed to retrieve project %s for user %s: %s", project_ulid, current_user_id, e)
         return jsonify({'error': 'Failed to retrieve project'}), 400
 
 def is_valid_ulid(ulid_str):
@@ -145,6 +443,7 @@ def delete_project(project_ulid):
         if project.owner_ulid != current_user_id:
             return jsonify({'error': 'Access denied - not project owner'}), 403
         
+        # The blob reference is released by the Project after_delete hook
         db.session.delete(project)
         db.session.commit()
         
@@ -152,5 +451,5 @@ def delete_project(project_ulid):
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Failed to delete project {project_ulid} for user {current_user_id}: {str(e)}")
+        logger.error("Failed to delete project %s for user %s: %s", project_ulid, current_user_id, e)
         return jsonify({'error': 'Failed to delete project'}), 400
\ No newline at end of file
@@ -1,7 +1,7 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.common.db import db
-from app.common.models import User
+from app.common import repository
 
 users_bp = Blueprint('users', __name__)
 
@@ -13,7 +13,7 @@ def get_current_user():
         current_user_id = get_jwt_identity()
         
         # Find the current user
-        user = User.query.get(current_user_id)
+        user = repository.get_user(current_user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
@@ -24,7 +24,11 @@ def get_current_user():
             'first_name': user.first_name,
             'last_name': user.last_name,
             'created_at': user.created_at.isoformat() if user.created_at else None,
-            'updated_at': user.updated_at.isoformat() if user.updated_at else None
+            'updated_at': user.updated_at.isoformat() if user.updated_at else None,
+            'storage': {
+                'used_bytes': user.storage_used_bytes,
+                'quota_bytes': current_app.config['USER_STORAGE_QUOTA_BYTES']
+            }
         }
         
         return jsonify(user_data), 200
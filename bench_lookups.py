@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the per-request lookups: ORM queries vs the Core repository
+"""
+from datetime import datetime, timedelta
+from flask import Flask
+from ulid import ULID
+import sys
+import time
+import uuid
+
+from app.common.db import db
+from app.common.models import User, Project, ProjectBlob, TokenBlocklist
+from app.common import repository
+
+ITERATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+def create_bench_app():
+    """Create a minimal app on an in-memory SQLite database"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    return app
+
+def seed():
+    """Insert a user, a project and a populated blocklist"""
+    user = User(user_ulid=str(ULID()), nickname='bench', email='bench@example.com',
+                first_name='Bench', last_name='User')
+    user.set_password('Password123')
+    db.session.add(user)
+
+    data = {'elements': [{'type': 'node'}] * 10}
+    summary = Project.summarize_data(data)
+    blob = ProjectBlob(content_hash=summary['content_hash'], data=data, ref_count=1)
+    project = Project(project_ulid=str(ULID()), name='bench', owner_ulid=user.user_ulid,
+                      data_size=summary['data_size'], element_count=summary['element_count'],
+                      element_counts=summary['element_counts'], content_hash=summary['content_hash'])
+    db.session.add_all([blob, project])
+
+    expires_at = datetime.utcnow() + timedelta(hours=1)
+    db.session.add_all([TokenBlocklist(jti=str(uuid.uuid4()), token_type='access',
+                                       user_id=user.user_ulid, expires_at=expires_at) for _ in range(1000)])
+    db.session.commit()
+    return user.user_ulid, project.project_ulid
+
+def bench(label, func):
+    """Time func over ITERATIONS calls, each in a fresh session like a request"""
+    func()
+    db.session.remove()
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        func()
+        db.session.remove()
+    per_call = (time.perf_counter() - started) / ITERATIONS * 1e6
+    print(f"{label:<40} {per_call:8.1f} us/call")
+    return per_call
+
+def main():
+    app = create_bench_app()
+    with app.app_context():
+        db.create_all()
+        user_ulid, project_ulid = seed()
+        missing_jti = str(uuid.uuid4())
+
+        comparisons = [
+            ('blocklist check',
+             lambda: TokenBlocklist.is_jti_blocklisted(missing_jti),
+             lambda: repository.is_jti_blocklisted(missing_jti)),
+            ('user by ULID',
+             lambda: User.query.get(user_ulid).email,
+             lambda: repository.get_user(user_ulid).email),
+            ('project row (ownership + etag)',
+             lambda: Project.query.get(project_ulid).etag(),
+             lambda: repository.get_project(project_ulid).etag())
+        ]
+
+        print(f"{ITERATIONS} iterations on SQLite (in-memory)")
+        print("=" * 60)
+        for name, orm_lookup, core_lookup in comparisons:
+            orm = bench(f"{name} [ORM]", orm_lookup)
+            core = bench(f"{name} [Core]", core_lookup)
+            print(f"{'':<40} {orm / core:8.2f}x faster")
+
+if __name__ == "__main__":
+    main()
@@ -40,7 +40,7 @@ def test_register():
     return None
 
 def test_login():
-    """Test user login"""
+    """Test user login, returning the refresh token"""
     print("\nTesting user login...")
     login_data = {
         "email": "test2@mail.com",
@@ -51,11 +51,34 @@ def test_login():
         response = requests.post(f"{API_BASE}/api/auth/login", json=login_data)
         print(f"Login: {response.status_code} - {response.json()}")
         if response.status_code == 200:
-            return response.json().get('token')
+            return response.json().get('refresh_token')
     except Exception as e:
         print(f"Login failed: {e}")
     return None
 
+def test_refresh(refresh_token):
+    """Test refresh token rotation"""
+    if not refresh_token:
+        print("\nSkipping refresh test - no refresh token")
+        return None
+        
+    print("\nTesting token refresh...")
+    headers = {"Authorization": f"Bearer {refresh_token}"}
+    
+    try:
+        response = requests.post(f"{API_BASE}/api/auth/refresh", headers=headers)
+        print(f"Refresh: {response.status_code} - {response.json()}")
+        
+        # The old refresh token must not work a second time
+        reuse = requests.post(f"{API_BASE}/api/auth/refresh", headers=headers)
+        print(f"Refresh token reuse: {reuse.status_code} - {reuse.json()}")
+        
+        if response.status_code == 200:
+            return response.json().get('token')
+    except Exception as e:
+        print(f"Refresh failed: {e}")
+    return None
+
 def test_logout(token):
     """Test user logout"""
     if not token:
@@ -131,9 +154,10 @@ def main():
     # Test registration
     token = test_register()
     
-    # Test login (in case registration fails due to existing user)
+    # Test login and refresh (also covers registration failing due to an existing user)
+    refreshed_token = test_refresh(test_login())
     if not token:
-        token = test_login()
+        token = refreshed_token
     
     # Test project creation with valid token
     test_create_project(token)
@@ -0,0 +1,18 @@
+import os
+
+# Configuration is read when the app package is first imported, so set it up before any test module does
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ['RATE_LIMIT_ENABLED'] = 'false'
+os.environ.setdefault('JWT_SECRET_KEY', 'test-secret-key-that-is-long-enough-for-hs256')
+os.environ.setdefault('MAIL_SERVER_API_KEY', 'test')
+os.environ.setdefault('MAIL_SERVER_DOMAIN', 'example.com')
+
+import email_validator
+import pytest
+
+@pytest.fixture(scope='session', autouse=True)
+def no_email_dns():
+    # No network in tests: skip the deliverability lookup of email domains
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(email_validator, 'CHECK_DELIVERABILITY', False)
+        yield
@@ -0,0 +1,86 @@
+"""
+Project change feed delivery around the event broker's first poll
+"""
+import time
+import pytest
+
+from app import create_app
+from app.config import Config
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    # The broker polls from its own thread, which needs a database file rather than a shared in-memory connection
+    database = tmp_path_factory.mktemp('events') / 'events.db'
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{database}')
+        patch.setattr(Config, 'EVENTS_MAX_STREAM_SECONDS', 3)
+        return create_app()
+
+@pytest.fixture(scope='module')
+def auth_headers(app):
+    response = app.test_client().post('/api/auth/register', json={
+        'nickname': 'listener',
+        'email': 'listener@example.com',
+        'password': 'Password123',
+        'first_name': 'Event',
+        'last_name': 'Listener'
+    })
+    assert response.status_code == 201
+    return {'Authorization': f"Bearer {response.get_json()['token']}"}
+
+def save_project(client, headers, name):
+    response = client.post('/api/projects/save', json={'name': name, 'data': {'nodes': []}}, headers=headers)
+    assert response.status_code == 201
+
+def read_events(response):
+    """Read a stream until it ends and return its (id, event) pairs"""
+    events = []
+    event_id = None
+    for line in b''.join(response.response).decode().splitlines():
+        if line.startswith('id: '):
+            event_id = int(line[4:])
+        elif line.startswith('event: '):
+            events.append((event_id, line[7:]))
+    return events
+
+def test_new_stream_gets_event_saved_before_first_poll(app, auth_headers):
+    client = app.test_client()
+    response = client.get('/api/projects/events', headers=auth_headers, buffered=False)
+    assert response.status_code == 200
+
+    # The broker was idle, so this commits before it has polled even once
+    save_project(client, auth_headers, 'right away')
+
+    assert [event for _, event in read_events(response)] == ['project.created']
+
+def wait_until_idle(app):
+    """Let the broker notice it has no listeners left and stop polling"""
+    broker = app.extensions['event_broker']
+    assert broker.subscriber_count() == 0
+    time.sleep(broker.poll_interval * 2)
+
+def test_resumed_stream_gets_backlog_and_event_saved_before_first_poll(app, auth_headers):
+    wait_until_idle(app)
+    client = app.test_client()
+    save_project(client, auth_headers, 'while away')
+
+    # Resume from the start: the backlog holds both earlier projects
+    response = client.get('/api/projects/events', headers=dict(auth_headers, **{'Last-Event-ID': '0'}), buffered=False)
+    assert response.status_code == 200
+    save_project(client, auth_headers, 'right away again')
+
+    events = read_events(response)
+    assert [event for _, event in events] == ['project.created'] * 3
+    ids = [event_id for event_id, _ in events]
+    assert ids == sorted(set(ids))
+
+def test_stream_accepts_access_token_in_query_string(app, auth_headers):
+    client = app.test_client()
+    token = auth_headers['Authorization'].split(' ', 1)[1]
+
+    response = client.get(f'/api/projects/events?jwt={token}', buffered=False)
+    assert response.status_code == 200
+    response.close()
+
+    # Only the event stream, which browsers open without custom headers, takes it there
+    assert client.get(f'/api/projects/my-projects?jwt={token}').status_code == 401
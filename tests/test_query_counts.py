@@ -0,0 +1,108 @@
+"""
+SQL statements run by the registration and password reset endpoints
+"""
+from contextlib import contextmanager
+import pytest
+
+from app import create_app
+from app.common.db import db
+from app.common.email_service import email_service
+from app.common.models import User
+
+EMAIL = 'reset@example.com'
+
+@pytest.fixture(scope='module')
+def app():
+    app = create_app()
+    with app.app_context():
+        user = User(nickname='reset', email=EMAIL, first_name='Reset', last_name='User')
+        user.set_password('Password123')
+        db.session.add(user)
+        db.session.commit()
+    return app
+
+@pytest.fixture
+def client(app, monkeypatch):
+    # Capture the email instead of sending it
+    sent = []
+    monkeypatch.setattr(email_service, 'send_otp_email', lambda **kwargs: sent.append(kwargs) or True)
+    client = app.test_client()
+    client.sent_emails = sent
+    return client
+
+@contextmanager
+def count_statements(app):
+    """Collect every SQL statement executed inside the block as its verb, plus the table it writes"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        words = statement.split()
+        verb = words[0].upper()
+        if verb == 'UPDATE':
+            verb += ' ' + words[1]
+        elif verb in ('INSERT', 'DELETE'):
+            verb += ' ' + words[2]
+        statements.append(verb)
+
+    with app.app_context():
+        engine = db.engine
+    db.event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        db.event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+def test_register_queries(app, client):
+    user = {
+        'nickname': 'newcomer',
+        'email': 'newcomer@example.com',
+        'password': 'Password123',
+        'first_name': 'New',
+        'last_name': 'Comer'
+    }
+    with count_statements(app) as statements:
+        response = client.post('/api/auth/register', json=user)
+    assert response.status_code == 201
+    assert statements == ['INSERT users', 'INSERT refresh_tokens']
+
+    # Duplicates are caught by the unique constraints, not by a SELECT beforehand
+    with count_statements(app) as statements:
+        response = client.post('/api/auth/register', json=dict(user, nickname='someone-else'))
+    assert response.status_code == 409
+    assert statements == ['INSERT users']
+
+def request_otp(app, client):
+    with count_statements(app) as statements:
+        response = client.post('/api/auth/forgot-password', json={'email': EMAIL})
+    assert response.status_code == 200
+    return client.sent_emails[-1]['otp_code'], statements
+
+def test_forgot_password_queries(app, client):
+    _, statements = request_otp(app, client)
+    assert statements == ['SELECT', 'UPDATE password_reset_otps', 'INSERT password_reset_otps']
+
+def test_verify_reset_otp_queries(app, client):
+    otp_code, _ = request_otp(app, client)
+    with count_statements(app) as statements:
+        response = client.post('/api/auth/verify-reset-otp', json={'email': EMAIL, 'otp_code': otp_code})
+    assert response.status_code == 200
+    assert statements == ['SELECT']
+
+def test_reset_password_queries(app, client):
+    otp_code, _ = request_otp(app, client)
+    with count_statements(app) as statements:
+        response = client.post('/api/auth/reset-password', json={
+            'email': EMAIL,
+            'otp_code': otp_code,
+            'new_password': 'NewPassword123'
+        })
+    assert response.status_code == 200
+    assert statements == ['SELECT', 'UPDATE password_reset_otps', 'UPDATE users']
+
+    # The OTP is single use
+    response = client.post('/api/auth/reset-password', json={
+        'email': EMAIL,
+        'otp_code': otp_code,
+        'new_password': 'OtherPassword123'
+    })
+    assert response.status_code == 400